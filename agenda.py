@@ -0,0 +1,62 @@
+import heapq
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+
+from export import task_time_key
+from indexes import SortedIndex
+
+# Nombre d'éléments affichés par page dans l'agenda
+AGENDA_PAGE_SIZE = 50
+
+
+class AgendaItem:
+    """Élément de l'agenda : une tâche d'une liste ou un événement du calendrier."""
+
+    __slots__ = ("key", "kind", "title", "source", "item")
+
+    def __init__(self, key: str, kind: str, title: str, source: str, item: dict):
+        self.key = key
+        self.kind = kind  # "task" ou "event"
+        self.title = title
+        self.source = source
+        self.item = item
+
+
+def build_pending_tasks_index(data: dict) -> SortedIndex:
+    """Index des seules tâches non terminées ; les éléments sont des couples (titre de liste, tâche)."""
+    return SortedIndex.build(
+        ((task_list["title"], task) for task_list in data["task_lists"].values()
+         for task in task_list["tasks"].values() if not task.get("completed", False)),
+        lambda item: task_time_key(item[1]),
+    )
+
+
+def _tasks(index: SortedIndex, start: str, now_key: str) -> Iterator[Tuple[str, AgendaItem]]:
+    # Comme pour les événements : une échéance sans heure ('AAAA-MM-JJ') reste affichée toute la journée
+    for key, (list_title, task) in index.range_items(start[:10]):
+        if len(key) > 10 and key < now_key:
+            continue
+        yield key, AgendaItem(key, "task", task["title"], list_title, task)
+
+
+def _events(index: SortedIndex, start: str, now_key: str) -> Iterator[Tuple[str, AgendaItem]]:
+    # On part du début de la journée pour garder les événements sans heure du jour même
+    for key, event in index.range_items(start[:10]):
+        if len(key) > 10 and key < now_key:
+            continue
+        yield key, AgendaItem(key, "event", event["title"], "Calendrier", event)
+
+
+def agenda_stream(tasks_index: SortedIndex, events_index: SortedIndex,
+                  start: Optional[str] = None) -> Iterator[AgendaItem]:
+    """Fusionne par ordre chronologique les tâches non terminées et les événements à partir de start.
+
+    Chaque index est positionné par dichotomie (O(log n)), puis les deux flux
+    déjà triés sont fusionnés paresseusement : on ne lit que ce qui est affiché.
+    """
+    start = start or datetime.now().strftime("%Y-%m-%d %H:%M")
+    merged = heapq.merge(_tasks(tasks_index, start, start), _events(events_index, start, start),
+                         key=lambda entry: entry[0])
+    for _, item in merged:
+        yield item
+
@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+import time as tm
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, Optional
+
+from coordination import FileLock, file_signature
+from store import profile_suffix
+from sync import mark_archived
+
+# Âge à partir duquel les tâches terminées et les événements passés sont archivés
+ARCHIVE_AFTER_DAYS = 30
+# Nombre de mois d'archive gardés en mémoire après lecture
+CACHED_MONTHS = 6
+# Nombre maximal de résultats affichés par une recherche dans les archives
+ARCHIVE_SEARCH_LIMIT = 50
+
+
+def _empty_partition() -> dict:
+    return {"tasks": {}, "events": {}}
+
+
+class Archive:
+    """Archives d'un profil, une partition JSON par mois ('archives/<profil>/AAAA-MM.json').
+
+    Les partitions ne sont lues qu'à la demande (navigation vers un mois passé
+    ou recherche) et seules les dernières consultées restent en mémoire, avec
+    la signature du fichier lu : une partition réécrite par une autre instance
+    est relue.
+    """
+
+    def __init__(self, profile: str, root: str = "archives"):
+        self.directory = os.path.join(root, profile_suffix(profile))
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _file(self, month: str) -> str:
+        return os.path.join(self.directory, f"{month}.json")
+
+    def months(self):
+        """Mois archivés ('AAAA-MM'), du plus récent au plus ancien."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((name[:-5] for name in os.listdir(self.directory) if name.endswith(".json")), reverse=True)
+
+    def month(self, month: str) -> dict:
+        """Partition d'un mois ('AAAA-MM'), lue sur disque au premier accès ou quand le fichier a changé."""
+        with self._lock:
+            signature = file_signature(self._file(month))
+            if month in self._cache and self._cache[month][1] == signature:
+                self._cache.move_to_end(month)
+                return self._cache[month][0]
+            return self._load(month)
+
+    def _load(self, month: str) -> dict:
+        partition, signature = _empty_partition(), None
+        try:
+            with open(self._file(month), "r", encoding="utf-8") as f:
+                stat = os.fstat(f.fileno())
+                partition, signature = json.load(f), (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        self._cache[month] = (partition, signature)
+        self._cache.move_to_end(month)
+        while len(self._cache) > CACHED_MONTHS:
+            self._cache.popitem(last=False)
+        return partition
+
+    def add(self, month: str, kind: str, items: Dict[str, dict]):
+        """Ajoute des éléments à une partition et la réécrit (elle seule).
+
+        Sous le verrou de fichier, la partition est relue sur disque : les
+        éléments archivés entre-temps par une autre instance sont conservés.
+        """
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with FileLock(self._file(month)):
+                partition = self._load(month)
+                partition[kind].update(items)
+                tmp_file = f"{self._file(month)}.tmp"
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    json.dump(partition, f, ensure_ascii=False, indent=4)
+                os.replace(tmp_file, self._file(month))
+                self._cache[month] = (partition, file_signature(self._file(month)))
+
+    def events_on(self, date_str: str):
+        """Événements archivés d'une journée 'AAAA-MM-JJ'."""
+        return [event for event in self.month(date_str[:7])["events"].values() if event["date"] == date_str]
+
+    def search(self, text: str) -> Iterator[dict]:
+        """Parcourt les archives, mois par mois, à la recherche d'un texte dans les titres."""
+        text = text.lower()
+        for month in self.months():
+            partition = self.month(month)
+            for kind in ("events", "tasks"):
+                for item in partition[kind].values():
+                    if text in item.get("title", "").lower():
+                        yield item
+
+
+def _task_archive_date(task: dict) -> Optional[datetime]:
+    """Date de référence d'une tâche terminée : sa date de complétion, à défaut son échéance."""
+    for key, fmt in (("completed_at", "%Y-%m-%d %H:%M"), ("time", "%Y-%m-%d %H:%M")):
+        try:
+            return datetime.strptime(task[key], fmt)
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+class Archiver:
+    """Déplace périodiquement les tâches terminées anciennes et les événements passés vers les archives.
+
+    Le jeu de données chargé en mémoire (et réécrit à chaque sauvegarde) ne
+    contient ainsi que les éléments récents ou à venir.
+    """
+
+    def __init__(self, store, profile: str, archive: Archive, days: int = ARCHIVE_AFTER_DAYS,
+                 interval: float = 3600, on_task_archived: Optional[Callable[[dict], None]] = None):
+        self.store = store
+        self.profile = profile
+        self.archive = archive
+        self.days = days
+        self.interval = interval
+        self.on_task_archived = on_task_archived
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once(datetime.now())
+            except Exception:
+                pass  # Nouvel essai au prochain passage
+            tm.sleep(self.interval)
+
+    def run_once(self, now: datetime) -> int:
+        """Archive ce qui est plus ancien que la limite ; retourne le nombre d'éléments déplacés."""
+        cutoff = now - timedelta(days=self.days)
+        cutoff_date = cutoff.strftime("%Y-%m-%d")
+        data = self.store.get(self.profile)
+        tasks_by_month: Dict[str, Dict[str, dict]] = {}
+        events_by_month: Dict[str, Dict[str, dict]] = {}
+
+        with self.store.lock:
+            for task_list in data["task_lists"].values():
+                for task in task_list["tasks"].values():
+                    if not task.get("completed", False):
+                        continue
+                    archive_date = _task_archive_date(task)
+                    if archive_date is not None and archive_date < cutoff:
+                        archived = dict(task, list_id=task_list["id"], list_title=task_list["title"])
+                        tasks_by_month.setdefault(archive_date.strftime("%Y-%m"), {})[task["id"]] = archived
+            for event in data["events"].values():
+                # Les événements encore à synchroniser restent dans le jeu courant
+                if event.get("date") and event["date"] < cutoff_date and not event.get("dirty"):
+                    events_by_month.setdefault(event["date"][:7], {})[event["id"]] = event
+
+            if not tasks_by_month and not events_by_month:
+                return 0
+
+            # Écrire les archives avant de retirer les éléments : une interruption ne perd rien
+            for month, tasks in tasks_by_month.items():
+                self.archive.add(month, "tasks", tasks)
+            for month, events in events_by_month.items():
+                self.archive.add(month, "events", events)
+
+            moved = 0
+            for tasks in tasks_by_month.values():
+                for task_id, archived in tasks.items():
+                    task = data["task_lists"][archived["list_id"]]["tasks"].pop(task_id)
+                    if self.on_task_archived:
+                        self.on_task_archived(task)
+                    moved += 1
+            for events in events_by_month.values():
+                for event_id in events:
+                    mark_archived(data, data["events"].pop(event_id))
+                    moved += 1
+            self.store.save(self.profile)
+
+        topics = [topic for topic, items in (("task_lists", tasks_by_month), ("events", events_by_month)) if items]
+        self.store.publish(self.profile, topics)
+        return moved
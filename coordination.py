@@ -0,0 +1,192 @@
+"""Coordination entre plusieurs instances qui partagent les mêmes fichiers de données.
+
+Deux fenêtres de l'application (ou deux serveurs) peuvent ouvrir le même
+data.json / schedule.json. Chaque écriture se fait alors en trois temps sous
+un verrou consultatif : relire le fichier s'il a changé depuis la dernière
+lecture, fusionner entité par entité les changements externes dans la copie
+en mémoire, puis écrire. En parallèle, un FileWatcher prévient dès qu'une
+autre instance a écrit, pour fusionner et rafraîchir sans attendre.
+"""
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+import threading
+import time as tm
+from typing import Callable, Dict, Iterable, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# Événements inotify utiles : fichier réécrit sur place ou remplacé par renommage
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+_MISSING = object()
+
+
+class FileLock:
+    """Verrou consultatif exclusif entre processus, posé sur un fichier '<nom>.lock' voisin.
+
+    S'utilise avec `with FileLock(chemin):` ; une nouvelle instance par section
+    critique (le verrou n'est pas réentrant).
+    """
+
+    def __init__(self, path: str):
+        self.path = f"{path}.lock"
+        self._fd: Optional[int] = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            while True:
+                try:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK abandonne après 10 s : on réessaie
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+def file_signature(path: str) -> Optional[tuple]:
+    """Identifie une version d'un fichier (inode, taille, date de modification) ; None s'il n'existe pas."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def merge_into(local: dict, base: dict, remote: dict) -> Set[str]:
+    """Fusionne dans local, en place, les changements faits sur disque depuis base.
+
+    Pour chaque clé (ex. l'id d'une tâche) : si seule la version externe a
+    changé depuis base, elle est reprise, suppression comprise ; si seule la
+    version locale a changé, elle est gardée. Si les deux ont changé, deux
+    dictionnaires sont fusionnés récursivement (une liste modifiée des deux
+    côtés garde les tâches ajoutées de part et d'autre) ; sinon la
+    modification locale l'emporte. Les dictionnaires existants sont modifiés
+    en place pour que les vues qui les référencent restent valides.
+
+    Retourne les clés de local qui ont changé.
+    """
+    changed = set()
+    for key in list(local.keys() | remote.keys()):
+        b, l, r = base.get(key, _MISSING), local.get(key, _MISSING), remote.get(key, _MISSING)
+        if l == r or r == b:
+            continue
+        if isinstance(l, dict) and isinstance(r, dict):
+            if merge_into(l, b if isinstance(b, dict) else {}, r):
+                changed.add(key)
+        elif l == b:
+            if r is _MISSING:
+                del local[key]
+            else:
+                local[key] = r
+            changed.add(key)
+    return changed
+
+
+def _libc_inotify():
+    """Fonctions inotify de la libc (Linux uniquement), ou None."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, "inotify_init1") and hasattr(libc, "inotify_add_watch") else None
+
+
+class FileWatcher:
+    """Surveille des fichiers et appelle on_change(chemin) quand l'un d'eux est réécrit ou remplacé.
+
+    Utilise inotify sous Linux (sur les dossiers, pour voir aussi les
+    remplacements atomiques) et, à défaut, compare la signature des fichiers
+    toutes les `interval` secondes. Les écritures de l'instance elle-même
+    déclenchent aussi on_change : c'est à l'appelant de les reconnaître
+    (voir file_signature).
+    """
+
+    def __init__(self, paths: Iterable[str], on_change: Callable[[str], None], interval: float = 1.0):
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.on_change = on_change
+        self.interval = interval
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _notify(self, path: str):
+        try:
+            self.on_change(path)
+        except Exception:
+            pass  # Fichier en cours d'écriture ou illisible : on réessaiera au prochain changement
+
+    def _run(self):
+        libc = _libc_inotify()
+        fd = libc.inotify_init1(os.O_CLOEXEC) if libc else -1
+        if fd < 0:
+            self._poll()
+        else:
+            self._watch_inotify(libc, fd)
+
+    def _watch_inotify(self, libc, fd: int):
+        watched: Dict[int, Dict[str, str]] = {}
+        for path in self.paths:
+            directory, name = os.path.split(path)
+            wd = libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                os.close(fd)
+                self._poll()
+                return
+            watched.setdefault(wd, {})[name] = path
+        while True:
+            buffer = os.read(fd, 64 * 1024)
+            changed = []
+            offset = 0
+            while offset < len(buffer):
+                wd, _, _, length = _INOTIFY_EVENT.unpack_from(buffer, offset)
+                offset += _INOTIFY_EVENT.size
+                name = buffer[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+                offset += length
+                path = watched.get(wd, {}).get(name)
+                if path and path not in changed:
+                    changed.append(path)
+            for path in changed:
+                self._notify(path)
+
+    def _poll(self):
+        signatures = {path: file_signature(path) for path in self.paths}
+        while True:
+            tm.sleep(self.interval)
+            for path in self.paths:
+                signature = file_signature(path)
+                if signature != signatures[path]:
+                    signatures[path] = signature
+                    self._notify(path)
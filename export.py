@@ -0,0 +1,228 @@
+"""Export des événements, de l'emploi du temps et des tâches aux formats ICS et CSV.
+
+Chaque exporteur est un générateur qui produit le fichier morceau par morceau :
+la mémoire utilisée reste constante quelle que soit la taille des données, et
+write_stream() envoie ces morceaux vers un fichier ou une socket au fil de l'eau.
+Le filtrage par dates s'appuie sur un SortedIndex pour ne parcourir que
+l'intervalle demandé.
+"""
+import csv
+import hashlib
+import io
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from indexes import SortedIndex
+from sync import escape_text, fold_line, vevent_lines
+
+ICS_HEADER = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Scheduly//FR"]
+ICS_FOOTER = ["END:VCALENDAR"]
+
+DUE_TIME_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}( \d{2}:\d{2})?$")
+
+# Jours de l'emploi du temps -> codes BYDAY des règles de récurrence ICS
+ICS_WEEKDAYS = {
+    "LUNDI": "MO", "MARDI": "TU", "MERCREDI": "WE", "JEUDI": "TH",
+    "VENDREDI": "FR", "SAMEDI": "SA", "DIMANCHE": "SU",
+}
+
+
+def event_date_key(event: dict) -> Optional[str]:
+    """Clé de tri d'un événement : 'YYYY-MM-DD HH:MM'."""
+    if not event.get("date"):
+        return None
+    return f"{event['date']} {event.get('time', '')}".strip()
+
+
+def task_time_key(task: dict) -> Optional[str]:
+    """Clé de tri d'une tâche : son échéance 'YYYY-MM-DD HH:MM' (None si le format est invalide)."""
+    value = task.get("time") or ""
+    return value if DUE_TIME_PATTERN.match(value) else None
+
+
+def build_events_index(data: dict) -> SortedIndex:
+    return SortedIndex.build(data["events"].values(), event_date_key)
+
+
+def _ics_lines(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        yield fold_line(line) + "\r\n"
+
+
+def _csv_rows(header: List[str], rows: Iterable[list]) -> Iterator[str]:
+    """Formate des lignes CSV une par une, avec un tampon réutilisé."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+
+def _fallback_uid(*parts: str) -> str:
+    digest = hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+    return f"{digest}@scheduly"
+
+
+def _select(items: Iterable, index: Optional[SortedIndex], start: Optional[str], end: Optional[str]):
+    """Éléments à exporter : l'intervalle demandé via l'index, sinon tout."""
+    if index is not None:
+        return index.range(start, end)
+    return items
+
+
+# --- Événements ---
+
+def events_ics(events: Iterable[dict] = (), index: Optional[SortedIndex] = None,
+               start: Optional[str] = None, end: Optional[str] = None) -> Iterator[str]:
+    """Exporte les événements au format ICS (bornes 'YYYY-MM-DD' inclusives, via l'index)."""
+    yield from _ics_lines(ICS_HEADER)
+    for event in _select(events, index, start, end):
+        if "uid" not in event:
+            event = dict(event, uid=event.get("id") or _fallback_uid(event.get("date", ""), event.get("time", ""),
+                                                                     event.get("title", "")))
+        try:
+            yield from _ics_lines(vevent_lines(event))
+        except ValueError:
+            continue  # Date invalide : l'événement est ignoré
+    yield from _ics_lines(ICS_FOOTER)
+
+
+def events_csv(events: Iterable[dict] = (), index: Optional[SortedIndex] = None,
+               start: Optional[str] = None, end: Optional[str] = None) -> Iterator[str]:
+    rows = ([event.get("date", ""), event.get("time", ""), event.get("title", ""),
+             event.get("description", "")]
+            for event in _select(events, index, start, end))
+    yield from _csv_rows(["date", "heure", "titre", "description"], rows)
+
+
+# --- Emploi du temps ---
+
+def schedule_csv(schedule: Dict[str, list]) -> Iterator[str]:
+    rows = ([day, slot.start_time.strftime("%H:%M"), slot.end_time.strftime("%H:%M"),
+             slot.course, slot.is_temporary, slot.color]
+            for day, slots in schedule.items() for slot in slots)
+    yield from _csv_rows(["jour", "debut", "fin", "cours", "temporaire", "couleur"], rows)
+
+
+def _slot_event(day_date: date, slot, stamp: str, uid: str, rrule: Optional[str] = None,
+                exdates: Iterable[date] = ()) -> List[str]:
+    start = datetime.combine(day_date, slot.start_time)
+    end = datetime.combine(day_date, slot.end_time)
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}",
+        f"DTEND:{end.strftime('%Y%m%dT%H%M%S')}",
+        f"SUMMARY:{escape_text(slot.course)}",
+    ]
+    if rrule:
+        lines.append(rrule)
+    lines.extend(f"EXDATE:{datetime.combine(excluded, slot.start_time).strftime('%Y%m%dT%H%M%S')}"
+                 for excluded in exdates)
+    lines.append("END:VEVENT")
+    return lines
+
+
+def schedule_ics(schedule: Dict[str, list], week_start: Optional[date] = None,
+                 weeks: Optional[dict] = None) -> Iterator[str]:
+    """Exporte la semaine type en événements hebdomadaires récurrents, à partir de week_start (lundi).
+
+    weeks (clé du lundi -> différences d'une semaine datée) ajoute les
+    créneaux propres à une semaine en événements uniques et retire des
+    récurrences les créneaux annulés (EXDATE).
+    """
+    if week_start is None:
+        today = date.today()
+        week_start = today - timedelta(days=today.weekday())
+    upcoming = sorted((date.fromisoformat(key), overlay) for key, overlay in (weeks or {}).items()
+                      if date.fromisoformat(key) >= week_start)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield from _ics_lines(ICS_HEADER)
+    for offset, (day, slots) in enumerate(schedule.items()):
+        day_date = week_start + timedelta(days=offset)
+        for slot in slots:
+            uid = _fallback_uid(day, slot.start_time.isoformat(), slot.course)
+            if slot.is_temporary:
+                yield from _ics_lines(_slot_event(day_date, slot, stamp, uid))
+            else:
+                exdates = [monday + timedelta(days=offset) for monday, overlay in upcoming
+                           if slot.id in overlay.cancelled]
+                rrule = f"RRULE:FREQ=WEEKLY;BYDAY={ICS_WEEKDAYS.get(day, 'MO')}"
+                yield from _ics_lines(_slot_event(day_date, slot, stamp, uid, rrule, exdates))
+        for monday, overlay in upcoming:
+            for slot in overlay.added.get(day, []):
+                uid = _fallback_uid(monday.isoformat(), day, slot.start_time.isoformat(), slot.course)
+                yield from _ics_lines(_slot_event(monday + timedelta(days=offset), slot, stamp, uid))
+    yield from _ics_lines(ICS_FOOTER)
+
+
+# --- Tâches ---
+
+def _task_items(task_lists: Dict[str, dict]):
+    for task_list in task_lists.values():
+        for task in task_list["tasks"].values():
+            yield task_list["title"], task
+
+
+def tasks_csv(task_lists: Dict[str, dict] = None, index: Optional[SortedIndex] = None,
+              start: Optional[str] = None, end: Optional[str] = None,
+              items: Iterable[tuple] = ()) -> Iterator[str]:
+    """Exporte les tâches en CSV ; items fournit directement des couples (titre de liste, tâche)."""
+    items = _select(_task_items(task_lists) if task_lists is not None else items, index, start, end)
+    rows = ([list_title, task["title"], task["time"], task.get("completed", False)]
+            for list_title, task in items)
+    yield from _csv_rows(["liste", "titre", "echeance", "terminee"], rows)
+
+
+def tasks_ics(task_lists: Dict[str, dict] = None, index: Optional[SortedIndex] = None,
+              start: Optional[str] = None, end: Optional[str] = None) -> Iterator[str]:
+    """Exporte les tâches en VTODO."""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield from _ics_lines(ICS_HEADER)
+    for list_title, task in _select(_task_items(task_lists or {}), index, start, end):
+        lines = [
+            "BEGIN:VTODO",
+            f"UID:{task.get('uid') or task.get('id') or _fallback_uid(list_title, task['time'], task['title'])}",
+            f"DTSTAMP:{stamp}",
+            f"SUMMARY:{escape_text(task['title'])}",
+            f"CATEGORIES:{escape_text(list_title)}",
+            f"STATUS:{'COMPLETED' if task.get('completed') else 'NEEDS-ACTION'}",
+        ]
+        try:
+            due = datetime.strptime(task["time"], "%Y-%m-%d %H:%M")
+            lines.append(f"DUE:{due.strftime('%Y%m%dT%H%M%S')}")
+        except ValueError:
+            pass
+        lines.append("END:VTODO")
+        yield from _ics_lines(lines)
+    yield from _ics_lines(ICS_FOOTER)
+
+
+# --- Écriture ---
+
+def write_stream(chunks: Iterable[str], target, encoding: str = "utf-8") -> int:
+    """Écrit les morceaux au fur et à mesure ; retourne le nombre d'octets écrits.
+
+    target peut être un chemin (écriture atomique), une socket (sendall) ou un
+    fichier binaire ouvert.
+    """
+    written = 0
+    if isinstance(target, (str, os.PathLike)):
+        tmp_file = f"{target}.tmp"
+        with open(tmp_file, "wb") as f:
+            written = write_stream(chunks, f, encoding)
+        os.replace(tmp_file, target)
+        return written
+    send = getattr(target, "sendall", None) or target.write
+    for chunk in chunks:
+        payload = chunk.encode(encoding)
+        send(payload)
+        written += len(payload)
+    return written
@@ -0,0 +1,89 @@
+from collections import deque
+from typing import Callable, List, Optional
+
+# Nombre d'opérations conservées dans l'historique d'annulation
+HISTORY_LIMIT = 100
+
+
+class Operation:
+    """Opération inversible enregistrée au moment d'une modification.
+
+    undo et redo ne capturent que l'entité concernée (une tâche, une liste,
+    une note, un événement ou un créneau) : l'annulation coûte la taille du
+    changement, jamais celle des données complètes. Ils retournent False
+    lorsque l'opération ne peut plus s'appliquer (ex. liste parente supprimée).
+    """
+
+    __slots__ = ("label", "topic", "undo", "redo")
+
+    def __init__(self, label: str, topic: str, undo: Callable[[], bool], redo: Callable[[], bool]):
+        self.label = label
+        self.topic = topic
+        self.undo = undo
+        self.redo = redo
+
+
+class History:
+    """Piles d'annulation et de rétablissement, de taille bornée."""
+
+    def __init__(self, limit: int = HISTORY_LIMIT):
+        self._undo: deque = deque(maxlen=limit)
+        self._redo: List[Operation] = []
+
+    def record(self, operation: Operation):
+        self._undo.append(operation)
+        self._redo.clear()
+
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def undo(self) -> Optional[Operation]:
+        """Annule la dernière opération ; retourne None si rien n'a pu être annulé."""
+        if not self._undo:
+            return None
+        operation = self._undo.pop()
+        if not operation.undo():
+            return None
+        self._redo.append(operation)
+        return operation
+
+    def redo(self) -> Optional[Operation]:
+        if not self._redo:
+            return None
+        operation = self._redo.pop()
+        if not operation.redo():
+            return None
+        self._undo.append(operation)
+        return operation
+
+
+def dict_removal(label: str, topic: str, container: dict, key: str, value,
+                 on_restore: Optional[Callable[[], None]] = None,
+                 on_remove: Optional[Callable[[], None]] = None,
+                 attached: Optional[Callable[[], bool]] = None) -> Operation:
+    """Opération inverse d'une suppression dans un dictionnaire indexé par id.
+
+    attached() indique si container appartient encore aux données (ex. la liste
+    parente d'une tâche n'a pas été supprimée) ; sinon l'opération échoue.
+    """
+
+    def undo():
+        if key in container or (attached and not attached()):
+            return False
+        container[key] = value
+        if on_restore:
+            on_restore()
+        return True
+
+    def redo():
+        if container.get(key) is not value or (attached and not attached()):
+            return False
+        del container[key]
+        if on_remove:
+            on_remove()
+        return True
+
+    return Operation(label, topic, undo, redo)
@@ -0,0 +1,50 @@
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+class SortedIndex:
+    """Index trié (clé -> éléments) pour les recherches par intervalle en O(log n).
+
+    Les clés sont des chaînes triables (ex. '2024-05-01' ou '2024-05-01 08:30').
+    Plusieurs éléments peuvent partager la même clé ; ils sont distingués par
+    un numéro d'insertion, ce qui évite de comparer les éléments eux-mêmes.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[str, int]] = []
+        self._items: dict = {}
+        self._counter = 0
+
+    @classmethod
+    def build(cls, items: Iterable[Any], key: Callable[[Any], Optional[str]]) -> "SortedIndex":
+        """Construit l'index en une passe puis un tri (O(n log n))."""
+        index = cls()
+        for item in items:
+            k = key(item)
+            if k is None:
+                continue
+            index._counter += 1
+            index._keys.append((k, index._counter))
+            index._items[index._counter] = item
+        index._keys.sort()
+        return index
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def range(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Any]:
+        """Parcourt dans l'ordre les éléments dont la clé est dans [start, end].
+
+        end est inclusif sur le préfixe : range('2024-05-01', '2024-05-31')
+        inclut aussi '2024-05-31 23:59'.
+        """
+        for _, item in self.range_items(start, end):
+            yield item
+
+    def range_items(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+        """Comme range(), mais produit des couples (clé, élément)."""
+        lo = 0 if start is None else bisect_left(self._keys, (start,))
+        hi = len(self._keys) if end is None else bisect_right(self._keys, (end + "\uffff",))
+        for i in range(lo, hi):
+            k, seq = self._keys[i]
+            yield k, self._items[seq]
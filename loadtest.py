@@ -0,0 +1,362 @@
+"""Banc de charge sans interface : rejoue des sessions scriptées contre main() et mesure chaque action.
+
+main(page) tourne sur une vraie ft.Page reliée à une connexion factice qui
+enregistre les commandes envoyées au client au lieu de les transmettre : on
+mesure ainsi le diff réellement produit par chaque page.update(). Pour chaque
+type d'action (ouvrir un onglet, ajouter une tâche, cocher une case, changer
+de mois, ajouter un créneau...) le rapport donne les latences p50/p95/p99 du
+gestionnaire, la taille du diff envoyé, le nombre d'écritures disque, le
+nombre de page.update() et la taille de l'arbre de contrôles.
+
+Exemple :
+    python loadtest.py --tasks 2000 --budget-p95 50 --budget-writes 1
+
+Le code de sortie vaut 1 si un budget est dépassé, ou si un cours de
+l'emploi du temps n'est pas dessiné à la ligne de son heure de début.
+"""
+import argparse
+import asyncio
+import builtins
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time as tm
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List
+
+import flet as ft
+from flet.core.connection import Connection
+from flet.core.control_event import ControlEvent
+from flet.core.protocol import Command, CommandEncoder, PageCommandResponsePayload, PageCommandsBatchResponsePayload
+
+SCHEDULE_DAYS = ("Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi")
+
+
+class RecordingConnection(Connection):
+    """Connexion factice : attribue des ids aux contrôles ajoutés et compte les octets du diff."""
+
+    def __init__(self):
+        super().__init__()
+        self.page_url = "http://localhost"
+        self.bytes_sent = 0
+        self._next_id = 1
+
+    def _record(self, commands: List[Command]):
+        self.bytes_sent += len(json.dumps(commands, cls=CommandEncoder, separators=(",", ":")).encode("utf-8"))
+
+    def send_command(self, session_id: str, command: Command):
+        self._record([command])
+        return PageCommandResponsePayload(result="", error="")
+
+    def send_commands(self, session_id: str, commands: List[Command]):
+        self._record(commands)
+        results = []
+        for command in commands:
+            if command.name != "add":
+                continue
+            # Même numérotation que le serveur : un id par contrôle du lot ajouté
+            batch = ([command] if command.values else []) + command.commands
+            ids = []
+            for sub_command in batch:
+                control_id = sub_command.attrs.get("id") or f"_{self._next_id}"
+                self._next_id += 1
+                ids.append(control_id)
+            results.append(" ".join(ids))
+        return PageCommandsBatchResponsePayload(results=results, error="")
+
+
+class HeadlessPage(ft.Page):
+    """ft.Page sans client : les tâches asynchrones sont exécutées sur place et les update() comptés."""
+
+    def __init__(self, conn: RecordingConnection):
+        self._loop = asyncio.new_event_loop()
+        super().__init__(conn, "charge", self._loop)
+        # Route normalement envoyée par le client à la connexion
+        self._set_attr("route", "/", dirty=False)
+        self.updates = 0
+
+    def update(self, *controls):
+        self.updates += 1
+        super().update(*controls)
+
+    def run_task(self, handler, *args, **kwargs):
+        future = Future()
+        future.set_result(self._loop.run_until_complete(handler(*args, **kwargs)))
+        return future
+
+    def run_thread(self, handler, *args, **kwargs):
+        handler(*args, **kwargs)
+
+
+class DiskWrites:
+    """Compte les fichiers ouverts en écriture par le fil de la session (les services de fond sont ignorés)."""
+
+    def __init__(self):
+        self.count = 0
+        self._thread = threading.current_thread()
+        self._open = builtins.open
+
+    def __enter__(self):
+        def counting_open(file, mode="r", *args, **kwargs):
+            if threading.current_thread() is self._thread and any(flag in mode for flag in "wax+"):
+                self.count += 1
+            return self._open(file, mode, *args, **kwargs)
+
+        builtins.open = counting_open
+        return self
+
+    def __exit__(self, *exc):
+        builtins.open = self._open
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Percentile au rang le plus proche."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class ActionStats:
+    def __init__(self):
+        self.latencies: List[float] = []  # ms
+        self.diff_bytes: List[int] = []
+        self.writes: List[int] = []
+        self.updates: List[int] = []
+        self.controls = 0
+
+
+class Session:
+    """Session utilisateur simulée : recherche des contrôles, déclenche leurs événements et mesure."""
+
+    def __init__(self, page: HeadlessPage, conn: RecordingConnection, writes: DiskWrites):
+        self.page = page
+        self.conn = conn
+        self.writes = writes
+        self.stats: Dict[str, ActionStats] = {}
+
+    # --- Arbre de contrôles ---
+
+    def walk(self, control=None) -> Iterator[ft.Control]:
+        stack = [control or self.page]
+        while stack:
+            current = stack.pop()
+            # Onglets masqués (gardés en cache) : invisibles pour l'utilisateur, donc pour le script
+            if current is not self.page and not current.visible:
+                continue
+            yield current
+            stack.extend(current._get_children())
+            # Le dialogue ouvert via page.dialog n'est pas un enfant de la vue
+            if current is self.page and self.page.dialog is not None:
+                stack.append(self.page.dialog)
+
+    def find(self, predicate: Callable[[ft.Control], bool], root=None) -> ft.Control:
+        for control in self.walk(root):
+            if predicate(control):
+                return control
+        raise LookupError("Contrôle introuvable")
+
+    def find_all(self, predicate: Callable[[ft.Control], bool], root=None) -> List[ft.Control]:
+        return [control for control in self.walk(root) if predicate(control)]
+
+    def by_tooltip(self, tooltip: str) -> ft.Control:
+        return self.find(lambda c: getattr(c, "tooltip", None) == tooltip)
+
+    def by_text(self, text: str, root=None) -> ft.Control:
+        return self.find(lambda c: isinstance(c, (ft.ElevatedButton, ft.TextButton)) and c.text == text, root)
+
+    def by_label(self, label: str, root=None) -> ft.Control:
+        return self.find(lambda c: getattr(c, "label", None) == label, root)
+
+    # --- Saisie et événements ---
+
+    def type(self, control: ft.Control, value):
+        """Valeur saisie côté client : elle arrive avec l'événement et ne produit pas de diff."""
+        control._set_attr("value", value, dirty=False)
+
+    def fire(self, action: str, control: ft.Control, event: str = "click", data: str = ""):
+        handler = control.event_handlers.get(event)
+        if handler is None:
+            raise LookupError(f"Pas de gestionnaire '{event}' sur {control}")
+        stats = self.stats.setdefault(action, ActionStats())
+        bytes_before, writes_before, updates_before = self.conn.bytes_sent, self.writes.count, self.page.updates
+        started = tm.perf_counter()
+        handler(ControlEvent(control.uid, event, data, control, self.page))
+        stats.latencies.append((tm.perf_counter() - started) * 1000)
+        stats.diff_bytes.append(self.conn.bytes_sent - bytes_before)
+        stats.writes.append(self.writes.count - writes_before)
+        stats.updates.append(self.page.updates - updates_before)
+        stats.controls = max(stats.controls, sum(1 for _ in self.walk()))
+
+    def change(self, action: str, control: ft.Control, value):
+        self.type(control, value)
+        self.fire(action, control, "change", str(value).lower() if isinstance(value, bool) else str(value))
+
+
+# --- Sessions scriptées ---
+
+def open_tabs(session: Session, rounds: int):
+    for _ in range(rounds):
+        for tab in ("Tâches", "Notes", "Planning", "Agenda", "Calendrier"):
+            session.fire("ouvrir onglet", session.by_tooltip(tab))
+
+
+def tasks_session(session: Session, count: int, toggles: int):
+    session.fire("ouvrir onglet", session.by_tooltip("Tâches"))
+    session.fire("dialogue liste", session.by_text("Ajouter une liste de tâches"))
+    session.type(session.by_label("Titre de la nouvelle liste", session.page.dialog), f"Charge {datetime.now():%H%M%S}")
+    session.fire("ajouter liste", session.by_text("Ajouter", session.page.dialog))
+    tile = session.find_all(lambda c: isinstance(c, ft.ListTile) and c.event_handlers.get("click"))[-1]
+    session.fire("ouvrir liste", tile)
+
+    title_field = session.by_label("Titre de la tâche")
+    time_field = session.by_label("Heure (YYYY-MM-DD HH:MM)")
+    add_button = session.by_text("Ajouter une tâche")
+    start = datetime.now().replace(second=0, microsecond=0)
+    for i in range(count):
+        session.type(title_field, f"Tâche {i}")
+        session.type(time_field, (start + timedelta(hours=i)).strftime("%Y-%m-%d %H:%M"))
+        session.fire("ajouter tâche", add_button)
+
+    for i in range(min(toggles, count)):
+        # Les tuiles sont reconstruites après chaque changement : on relit la case à chaque fois
+        checkboxes = session.find_all(lambda c: isinstance(c, ft.Checkbox), session.page.views[-1])
+        checkbox = checkboxes[i]
+        session.change("cocher tâche", checkbox, not checkbox.value)
+
+    session.fire("retour", session.find(lambda c: isinstance(c, ft.IconButton) and c.icon == ft.Icons.ARROW_BACK))
+
+
+def calendar_session(session: Session, months: int):
+    session.fire("ouvrir onglet", session.by_tooltip("Calendrier"))
+    forward = session.find(lambda c: isinstance(c, ft.IconButton) and c.icon == ft.Icons.ARROW_FORWARD)
+    back = session.find(lambda c: isinstance(c, ft.IconButton) and c.icon == ft.Icons.ARROW_BACK)
+    for _ in range(months):
+        session.fire("mois suivant", forward)
+    for _ in range(months):
+        session.fire("mois précédent", back)
+
+
+def add_slot(session: Session, day: str, start: str, end: str, course: str):
+    session.fire("dialogue créneau", session.by_tooltip("Ajouter un événement"))
+    dialog = session.page.dialog
+    session.type(session.by_label("Jour", dialog), day)
+    session.type(session.by_label("Heure de début (ex: 6h)", dialog), start)
+    session.type(session.by_label("Heure de fin (ex: 7h)", dialog), end)
+    session.type(session.by_label("Cours", dialog), course)
+    session.type(session.by_label("Couleur de l'événement", dialog), "lightblue")
+    session.fire("ajouter créneau", session.by_text("Ajouter", dialog))
+
+
+def schedule_session(session: Session, slots: int):
+    session.fire("ouvrir onglet", session.by_tooltip("Planning"))
+    for i in range(slots):
+        day, hour = SCHEDULE_DAYS[i % len(SCHEDULE_DAYS)], 6 + (i // len(SCHEDULE_DAYS)) % 16
+        add_slot(session, day, f"{hour}h", f"{hour}h30", f"Cours {i}")
+    # Cours qui partagent une ligne de la grille à l'heure : ils ne doivent pas décaler les suivants
+    for start, end in (("8h", "8h30"), ("8h30", "9h"), ("9h", "10h"), ("10h", "11h")):
+        add_slot(session, "Samedi", start, end, f"Samedi {start}")
+    # Parcours des semaines datées : chacune est résolue une fois puis servie depuis le cache
+    for _ in range(2):
+        for _ in range(4):
+            session.fire("semaine suivante", session.by_tooltip("Semaine suivante"))
+        for _ in range(4):
+            session.fire("semaine précédente", session.by_tooltip("Semaine précédente"))
+
+
+def check_layout(manager) -> List[str]:
+    """Vérifie que chaque cours est dessiné dans le bloc qui contient la ligne de son heure de début."""
+    failures = []
+    for week in [None, *manager.weeks]:
+        for day, day_slots in manager.week(week).items():
+            drawn = 0
+            for first, rows, slots in manager.layout_day(day, week):
+                drawn += len(slots)
+                for slot in slots:
+                    row = manager.row_of(slot.start_time)
+                    if not first <= row < first + rows or (slot is slots[0] and row != first):
+                        failures.append(f"{day} {week or 'type'} : {slot.course} dessiné ligne {first}, "
+                                        f"attendu ligne {row}")
+            if drawn != len(day_slots):
+                failures.append(f"{day} {week or 'type'} : {drawn} cours dessinés sur {len(day_slots)}")
+    return failures
+
+
+# --- Rapport ---
+
+def report(stats: Dict[str, ActionStats]) -> str:
+    header = f"{'action':<18}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'diff moy':>11}{'diff max':>11}" \
+             f"{'écr./act.':>10}{'upd./act.':>10}{'contrôles':>11}"
+    lines = [header, "-" * len(header)]
+    for action, s in stats.items():
+        n = len(s.latencies)
+        lines.append(
+            f"{action:<18}{n:>6}{percentile(s.latencies, 50):>9.2f}{percentile(s.latencies, 95):>9.2f}"
+            f"{percentile(s.latencies, 99):>9.2f}{sum(s.diff_bytes) / n / 1024:>9.1f}Ko{max(s.diff_bytes) / 1024:>9.1f}Ko"
+            f"{sum(s.writes) / n:>10.2f}{sum(s.updates) / n:>10.2f}{s.controls:>11}"
+        )
+    return "\n".join(lines)
+
+
+def check_budgets(stats: Dict[str, ActionStats], args) -> List[str]:
+    """Liste des dépassements de budget, action par action."""
+    failures = []
+    for action, s in stats.items():
+        for p, budget in ((50, args.budget_p50), (95, args.budget_p95), (99, args.budget_p99)):
+            if budget is not None and percentile(s.latencies, p) > budget:
+                failures.append(f"{action} : p{p} = {percentile(s.latencies, p):.2f} ms > {budget} ms")
+        if args.budget_diff is not None and max(s.diff_bytes) / 1024 > args.budget_diff:
+            failures.append(f"{action} : diff de {max(s.diff_bytes) / 1024:.1f} Ko > {args.budget_diff} Ko")
+        if args.budget_writes is not None and max(s.writes) > args.budget_writes:
+            failures.append(f"{action} : {max(s.writes)} écritures > {args.budget_writes}")
+    return failures
+
+
+def run(args) -> Dict[str, ActionStats]:
+    # Les données (data.json, schedule.json, archives) sont créées dans un dossier jetable
+    os.chdir(args.directory or tempfile.mkdtemp(prefix="scheduly-charge-"))
+    import main as app
+
+    conn = RecordingConnection()
+    page = HeadlessPage(conn)
+    with DiskWrites() as writes:
+        app.main(page)
+        session = Session(page, conn, writes)
+        open_tabs(session, args.tab_rounds)
+        tasks_session(session, args.tasks, args.toggles)
+        calendar_session(session, args.months)
+        schedule_session(session, args.slots)
+    manager = app.get_store().shared(app.DEFAULT_PROFILE, "schedule", None)
+    return session.stats, check_layout(manager)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc de charge de Scheduly (sans interface)")
+    parser.add_argument("--tasks", type=int, default=1000, help="Nombre de tâches ajoutées une à une")
+    parser.add_argument("--toggles", type=int, default=100, help="Nombre de cases cochées")
+    parser.add_argument("--months", type=int, default=12, help="Mois parcourus en avant puis en arrière")
+    parser.add_argument("--slots", type=int, default=40, help="Créneaux ajoutés à l'emploi du temps")
+    parser.add_argument("--tab-rounds", type=int, default=3, help="Tours complets des onglets")
+    parser.add_argument("--directory", help="Dossier de données (par défaut un dossier temporaire)")
+    parser.add_argument("--budget-p50", type=float, help="Latence p50 maximale par action (ms)")
+    parser.add_argument("--budget-p95", type=float, help="Latence p95 maximale par action (ms)")
+    parser.add_argument("--budget-p99", type=float, help="Latence p99 maximale par action (ms)")
+    parser.add_argument("--budget-diff", type=float, help="Diff maximal envoyé par action (Ko)")
+    parser.add_argument("--budget-writes", type=int, help="Écritures disque maximales par action")
+    args = parser.parse_args()
+
+    stats, layout_failures = run(args)
+    print(report(stats))
+    failures = check_budgets(stats, args)
+    if failures:
+        print("\nBudgets dépassés :")
+        for failure in failures:
+            print(f"  - {failure}")
+    if layout_failures:
+        print("\nGrille de l'emploi du temps incorrecte :")
+        for failure in layout_failures:
+            print(f"  - {failure}")
+    if failures or layout_failures:
+        sys.exit(1)
@@ -1,16 +1,31 @@
 import flet as ft
 import datetime
-import threading
-import time as tm
-import os
 import json
 import locale
+import argparse
+import os
+import threading
+from itertools import islice
+
+from store import DEFAULT_PROFILE, REMINDER_QUEUE_SIZE, Subscription, get_scheduler, get_store, new_id, schedule_file
+from sync import SyncEngine, mark_created, mark_deleted, unmark_deleted
+from export import build_events_index, events_ics, schedule_ics, tasks_csv, write_stream
+from agenda import AGENDA_PAGE_SIZE, agenda_stream, build_pending_tasks_index
+from stats import TaskStats
+from history import History, Operation, dict_removal
+from archive import ARCHIVE_SEARCH_LIMIT, Archive, Archiver
+from coordination import FileLock, FileWatcher, file_signature, merge_into
+from notes import AUTOSAVE_DELAY, NoteStore
+from placement import Placement, parse_request, parse_time, place_courses
 
 # Définir la locale en français pour afficher les mois en français
-locale.setlocale(locale.LC_TIME, 'fr_FR')
+try:
+    locale.setlocale(locale.LC_TIME, 'fr_FR')
+except locale.Error:
+    pass  # Locale non installée (serveur, CI) : noms de mois de la locale par défaut
 from datetime import datetime,time , timedelta, date
-from dataclasses import dataclass
-from typing import Optional, Dict, List
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Dict, List
 
 
 
@@ -21,11 +36,46 @@ class TimeSlot:
     course: str
     is_temporary: bool = False
     color: str = "lightblue"  # Couleur par défaut
+    id: str = field(default_factory=new_id)
 
 
 
-class ScheduleManager:
+# Granularités possibles de la grille de l'emploi du temps, en minutes
+GRANULARITIES = (15, 30, 60)
+# Hauteur (en pixels) d'une heure dans la grille de l'emploi du temps
+HOUR_HEIGHT = 64
+
+
+def week_key(day: date) -> str:
+    """Clé d'une semaine datée : la date de son lundi ('AAAA-MM-JJ')."""
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+class WeekOverlay:
+    """Différences d'une semaine datée avec la semaine type : créneaux ajoutés et créneaux annulés."""
+
+    __slots__ = ("added", "cancelled")
+
     def __init__(self):
+        self.added: Dict[str, List[TimeSlot]] = {}
+        self.cancelled: set = set()
+
+    def is_empty(self) -> bool:
+        return not self.cancelled and not any(self.added.values())
+
+
+class ScheduleManager:
+    def __init__(self, file: str = "schedule.json", granularity: int = 60,
+                 on_external_change: Optional[Callable[[], None]] = None, lock=None):
+        self.file = file
+        self.granularity = granularity
+        # Appelé quand des créneaux écrits par une autre instance ont été fusionnés
+        self.on_external_change = on_external_change
+        # Dernière version connue du fichier (base des fusions) et sa signature
+        self._disk: tuple = ({}, None)
+        # Verrou des créneaux : celui du magasin quand le gestionnaire est partagé entre les sessions,
+        # pour que vérification des conflits, modification et sauvegarde forment un seul bloc
+        self._lock = lock or threading.RLock()
         self.schedule: Dict[str, List[TimeSlot]] = {
             "LUNDI": [], "MARDI": [], "MERCREDI": [], "JEUDI": [],
             "VENDREDI": [], "SAMEDI": [], "DIMANCHE": []
@@ -33,106 +83,429 @@ class ScheduleManager:
         # Définir les heures de début et de fin de la journée
         self.day_start = time(6, 0)  # 6h00
         self.day_end = time(0, 0)  # 24h00 (minuit)
-        self.time_slots = self._generate_time_slots()
+        # Index id -> (jour, créneau), tenu à jour à chaque ajout ou suppression
+        self.slots_by_id: Dict[str, tuple] = {}
+        # Semaines datées : seules leurs différences avec la semaine type sont stockées
+        self.weeks: Dict[str, WeekOverlay] = {}
+        # Index id -> (semaine, jour, créneau) des créneaux ajoutés à une seule semaine
+        self.week_slots_by_id: Dict[str, tuple] = {}
+        # Semaines déjà résolues (semaine type + différences), vidé quand elles changent
+        self._resolved: Dict[str, Dict[str, List[TimeSlot]]] = {}
         self.load_schedule()
+        self.time_slots = self._generate_time_slots()
         self.remove_past_temporary_events()
 
     def _generate_time_slots(self) -> List[str]:
-        """Génère une liste de créneaux horaires standards sous la forme '6h-7h'."""
+        """Génère la liste des lignes de la grille sous la forme '6h-7h' (ou '6h-6h30' en demi-heures)."""
+        def label(moment):
+            return moment.strftime('%Hh') if moment.minute == 0 else moment.strftime('%Hh%M')
+
         slots = []
         current = datetime.combine(date.today(), self.day_start)
         end = datetime.combine(date.today() + timedelta(days=1), self.day_end)
 
         while current < end:
-            next_hour = current + timedelta(hours=1)
-            slots.append(f"{current.strftime('%Hh')}-{next_hour.strftime('%Hh')}")
-            current = next_hour
+            next_row = current + timedelta(minutes=self.granularity)
+            slots.append(f"{label(current)}-{label(next_row)}")
+            current = next_row
         return slots
 
-    def add_time_slot(self, day: str, start_time: time, end_time: time,
-                      course: str, is_temporary: bool = False, color: str = "lightblue") -> bool:
-        """Ajoute un créneau horaire dans l'emploi du temps."""
-        if day not in self.schedule:
-            return False
+    def set_granularity(self, granularity: int) -> bool:
+        """Change la durée d'une ligne de la grille (15, 30 ou 60 minutes)."""
+        with self._lock:
+            if granularity not in GRANULARITIES:
+                return False
+            self.granularity = granularity
+            self.time_slots = self._generate_time_slots()
+            self.save_schedule()
+            return True
 
-        # Ajuster end_time si nécessaire pour gérer minuit
-        if end_time == time(0, 0):
-            end_time = time(23, 59)
+    def week(self, week: Optional[str] = None) -> Dict[str, List[TimeSlot]]:
+        """Créneaux effectifs d'une semaine datée (clé de week_key), ou de la semaine type si week est None.
+
+        Résolue au premier affichage puis gardée en cache : les jours sans
+        différence partagent la liste de la semaine type, seuls les jours
+        modifiés sont recopiés.
+        """
+        with self._lock:
+            if week is None or week not in self.weeks:
+                return self.schedule
+            resolved = self._resolved.get(week)
+            if resolved is None:
+                overlay = self.weeks[week]
+                resolved = {}
+                for day, slots in self.schedule.items():
+                    added = overlay.added.get(day, [])
+                    if added or any(slot.id in overlay.cancelled for slot in slots):
+                        resolved[day] = sorted([slot for slot in slots if slot.id not in overlay.cancelled] + added,
+                                               key=lambda x: x.start_time)
+                    else:
+                        resolved[day] = slots
+                self._resolved[week] = resolved
+            return resolved
+
+    def _week_changed(self, week: Optional[str]):
+        """Oublie les semaines résolues touchées par un changement (toutes si la semaine type change)."""
+        if week is None:
+            self._resolved.clear()
+        else:
+            self._resolved.pop(week, None)
+            if week in self.weeks and self.weeks[week].is_empty():
+                del self.weeks[week]
+
+    def row_of(self, moment: time, round_up: bool = False) -> int:
+        """Ligne de la grille où tombe une heure (la suivante si round_up et qu'elle tombe en cours de ligne)."""
+        rows, remainder = divmod(moment.hour * 60 + moment.minute - (self.day_start.hour * 60 + self.day_start.minute),
+                                 self.granularity)
+        return rows + (1 if round_up and remainder else 0)
+
+    def layout_day(self, day: str, week: Optional[str] = None) -> List[tuple]:
+        """Découpe une journée en blocs (première ligne, nombre de lignes, créneaux ; liste vide si plage vide).
+
+        Calculé en une seule passe sur la liste triée des créneaux : un cours
+        sur plusieurs lignes forme un seul bloc, et les lignes vides consécutives
+        aussi. Chaque bloc commence à la ligne de l'heure de début de son premier
+        cours ; des cours qui partagent une ligne (ex. deux demi-heures avec une
+        grille à l'heure) sont réunis dans le même bloc, sans décaler les suivants.
+        """
+        total_rows = len(self.time_slots)
+        blocks = []
+        cursor = 0
+        group = None  # [première ligne, ligne de fin, créneaux] du bloc en cours
+        for slot in self.week(week)[day]:
+            first = self.row_of(slot.start_time)
+            if first >= total_rows:
+                break
+            last = min(max(self.row_of(slot.end_time, round_up=True), first + 1), total_rows)
+            if group is not None and first < group[1]:
+                group[1] = max(group[1], last)
+                group[2].append(slot)
+                continue
+            if group is not None:
+                blocks.append((group[0], group[1] - group[0], group[2]))
+                cursor = group[1]
+            if first > cursor:
+                blocks.append((cursor, first - cursor, []))
+            group = [first, last, [slot]]
+        if group is not None:
+            blocks.append((group[0], group[1] - group[0], group[2]))
+            cursor = group[1]
+        if cursor < total_rows:
+            blocks.append((cursor, total_rows - cursor, []))
+        return blocks
 
-        # Vérifier que les heures sont dans la plage valide
-        if (start_time < self.day_start or start_time >= end_time):
-            return False
+    def add_time_slot(self, day: str, start_time: time, end_time: time,
+                      course: str, is_temporary: bool = False, color: str = "lightblue",
+                      week: Optional[str] = None) -> bool:
+        """Ajoute un créneau horaire à la semaine type, ou à la seule semaine datée week."""
+        with self._lock:
+            if day not in self.schedule:
+                return False
 
-        new_slot = TimeSlot(start_time, end_time, course, is_temporary, color)
+            # Ajuster end_time si nécessaire pour gérer minuit
+            if end_time == time(0, 0):
+                end_time = time(23, 59)
 
-        # Vérifie les conflits
-        for slot in self.schedule[day]:
-            if (start_time < slot.end_time and end_time > slot.start_time):
+            # Vérifier que les heures sont dans la plage valide
+            if (start_time < self.day_start or start_time >= end_time):
                 return False
 
-        self.schedule[day].append(new_slot)
-        self.schedule[day].sort(key=lambda x: x.start_time)
-        self.save_schedule()
-        return True
-
-    def remove_time_slot(self, day: str, start_time: time) -> bool:
-        """Supprime un créneau horaire basé sur son heure de début."""
-        if day not in self.schedule:
-            return False
+            new_slot = TimeSlot(start_time, end_time, course, is_temporary, color)
 
-        original_length = len(self.schedule[day])
-        self.schedule[day] = [slot for slot in self.schedule[day]
-                              if slot.start_time != start_time]
+            # Vérifie les conflits
+            for slot in self._busy(day, week):
+                if (start_time < slot.end_time and end_time > slot.start_time):
+                    return False
 
-        if len(self.schedule[day]) != original_length:
+            self._insert(day, new_slot, week)
             self.save_schedule()
             return True
-        return False
 
-    def save_schedule(self):
-        """Sauvegarde l'emploi du temps dans un fichier JSON."""
-        schedule_dict = {}
+    def _busy(self, day: str, week: Optional[str] = None) -> List[TimeSlot]:
+        """Créneaux qu'un ajout à ce jour ne doit pas chevaucher.
+
+        Un créneau ajouté à la semaine type apparaît aussi dans chaque semaine
+        datée : il ne doit chevaucher aucun des créneaux propres à l'une d'elles,
+        à partir de la semaine en cours (les semaines passées ne comptent plus).
+        """
+        if week is not None:
+            return self.week(week)[day]
+        current = week_key(date.today())
+        return self.schedule[day] + [slot for overlay_week, overlay in self.weeks.items() if overlay_week >= current
+                                     for slot in overlay.added.get(day, [])]
+
+    def _insert(self, day: str, slot: TimeSlot, week: Optional[str]):
+        # Les listes sont remplacées, jamais modifiées sur place : un affichage en cours n'est pas perturbé
+        if week is None:
+            self.schedule[day] = sorted(self.schedule[day] + [slot], key=lambda x: x.start_time)
+            self.slots_by_id[slot.id] = (day, slot)
+        else:
+            added = self.weeks.setdefault(week, WeekOverlay()).added
+            added[day] = added.get(day, []) + [slot]
+            self.week_slots_by_id[slot.id] = (week, day, slot)
+        self._week_changed(week)
+
+    def remove_time_slot_by_id(self, slot_id: str, week: Optional[str] = None, save: bool = True) -> bool:
+        """Supprime exactement le créneau désigné par son identifiant.
+
+        Affiché dans une semaine datée, un créneau de la semaine type n'est
+        annulé que pour cette semaine ; un créneau propre à une semaine est
+        retiré de celle-ci.
+        """
+        with self._lock:
+            if slot_id in self.week_slots_by_id:
+                week, day, slot = self.week_slots_by_id.pop(slot_id)
+                added = self.weeks[week].added
+                added[day] = [s for s in added[day] if s is not slot]
+                self._week_changed(week)
+            elif slot_id not in self.slots_by_id:
+                return False
+            elif week is not None:
+                self.weeks.setdefault(week, WeekOverlay()).cancelled.add(slot_id)
+                self._week_changed(week)
+            else:
+                day, slot = self.slots_by_id.pop(slot_id)
+                # Comparaison par identité : deux créneaux identiques restent distincts
+                self.schedule[day] = [s for s in self.schedule[day] if s is not slot]
+                for overlay_week, overlay in list(self.weeks.items()):
+                    if slot_id in overlay.cancelled:
+                        overlay.cancelled.discard(slot_id)
+                        self._week_changed(overlay_week)
+                self._week_changed(None)
+            if save:
+                self.save_schedule()
+            return True
+
+    def restore_slot(self, day: str, slot: TimeSlot, week: Optional[str] = None, save: bool = True) -> bool:
+        """Remet en place un créneau supprimé (annulation), sauf s'il entre en conflit."""
+        with self._lock:
+            if day not in self.schedule or slot.id in self.week_slots_by_id:
+                return False
+            # Créneau de la semaine type annulé pour une semaine : il y redevient visible
+            uncancel = week is not None and slot.id in self.weeks.get(week, WeekOverlay()).cancelled
+            if slot.id in self.slots_by_id and not uncancel:
+                return False
+            for other in self._busy(day, week):
+                if other is not slot and slot.start_time < other.end_time and slot.end_time > other.start_time:
+                    return False
+            if uncancel:
+                self.weeks[week].cancelled.discard(slot.id)
+                self._week_changed(week)
+            else:
+                self._insert(day, slot, week)
+            if save:
+                self.save_schedule()
+            return True
+
+    def place_courses(self, requests: list, week: Optional[str] = None) -> tuple:
+        """Place automatiquement des cours dans les plages libres de la semaine type (ou d'une semaine datée).
+
+        Retourne (créneaux ajoutés en (jour, créneau), placement) ; une seule
+        sauvegarde pour tout le lot.
+        """
+        with self._lock:
+            occupied = {day: [(slot.start_time, slot.end_time) for slot in self._busy(day, week)]
+                        for day in self.schedule}
+        # La recherche tourne hors du verrou ; les plages trouvées sont revérifiées avant l'insertion
+        placement: Placement = place_courses(requests, list(self.schedule), occupied,
+                                             self.granularity, self.day_start)
+        added = []
+        with self._lock:
+            placed, placement.placed = placement.placed, []
+            for request, day, start, end in placed:
+                if any(start < slot.end_time and end > slot.start_time for slot in self._busy(day, week)):
+                    placement.unplaced.append(request)  # Plage prise entre-temps par une autre session
+                    continue
+                slot = TimeSlot(start, end, request.course, False, request.color)
+                self._insert(day, slot, week)
+                placement.placed.append((request, day, start, end))
+                added.append((day, slot))
+            if added:
+                self.save_schedule()
+        return added, placement
+
+    def snapshot(self) -> tuple:
+        """Copie (semaine type, semaines datées) à passer à un export qui tourne dans un autre thread."""
+        with self._lock:
+            schedule = {day: list(slots) for day, slots in self.schedule.items()}
+            weeks = {}
+            for week, overlay in self.weeks.items():
+                copied = weeks[week] = WeekOverlay()
+                copied.added = {day: list(slots) for day, slots in overlay.added.items()}
+                copied.cancelled = set(overlay.cancelled)
+        return schedule, weeks
+
+    @staticmethod
+    def _slot_to_dict(slot: TimeSlot) -> dict:
+        return {
+            "start_time": slot.start_time.strftime("%H:%M"),
+            "end_time": slot.end_time.strftime("%H:%M"),
+            "course": slot.course,
+            "is_temporary": slot.is_temporary,
+            "color": slot.color,  # Sauvegarder la couleur
+            "id": slot.id
+        }
+
+    @staticmethod
+    def _slot_from_dict(slot: dict) -> TimeSlot:
+        return TimeSlot(
+            datetime.strptime(slot["start_time"], "%H:%M").time(),
+            datetime.strptime(slot["end_time"], "%H:%M").time(),
+            slot["course"],
+            slot["is_temporary"],
+            slot.get("color", "lightblue"),  # Charger la couleur ou utiliser une couleur par défaut
+            slot.get("id") or new_id()
+        )
+
+    def _to_dict(self) -> dict:
+        schedule_dict = {"granularity": self.granularity}
         for day, slots in self.schedule.items():
-            schedule_dict[day] = [
-                {
-                    "start_time": slot.start_time.strftime("%H:%M"),
-                    "end_time": slot.end_time.strftime("%H:%M"),
-                    "course": slot.course,
-                    "is_temporary": slot.is_temporary,
-                    "color": slot.color  # Sauvegarder la couleur
-                } for slot in slots
-            ]
-        with open("schedule.json", "w", encoding='utf-8') as f:
-            json.dump(schedule_dict, f, ensure_ascii=False, indent=2)
+            schedule_dict[day] = [self._slot_to_dict(slot) for slot in slots]
+        if self.weeks:
+            schedule_dict["weeks"] = {
+                week: {
+                    "added": [dict(self._slot_to_dict(slot), day=day)
+                              for day, slots in overlay.added.items() for slot in slots],
+                    "cancelled": sorted(overlay.cancelled),
+                } for week, overlay in sorted(self.weeks.items())
+            }
+        return schedule_dict
 
-    def load_schedule(self):
-        """Charge l'emploi du temps depuis le fichier JSON."""
+    def save_schedule(self):
+        """Sauvegarde l'emploi du temps dans un fichier JSON, après fusion des changements d'une autre instance."""
+        with self._lock:
+            with FileLock(self.file):
+                merged = self._merge_external()
+                schedule_dict = self._to_dict()
+                tmp_file = f"{self.file}.tmp"
+                with open(tmp_file, "w", encoding='utf-8') as f:
+                    json.dump(schedule_dict, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_file, self.file)
+                self._disk = (schedule_dict, file_signature(self.file))
+        if merged and self.on_external_change:
+            self.on_external_change()
+
+    def _read(self) -> tuple:
+        """Lit le fichier ; retourne (contenu, signature), ou (None, None) s'il n'existe pas."""
         try:
-            with open("schedule.json", "r", encoding='utf-8') as f:
-                schedule_dict = json.load(f)
-                for day, slots in schedule_dict.items():
-                    self.schedule[day] = [
-                        TimeSlot(
-                            datetime.strptime(slot["start_time"], "%H:%M").time(),
-                            datetime.strptime(slot["end_time"], "%H:%M").time(),
-                            slot["course"],
-                            slot["is_temporary"],
-                            slot.get("color", "lightblue")  # Charger la couleur ou utiliser une couleur par défaut
-                        ) for slot in slots
-                    ]
+            with open(self.file, "r", encoding='utf-8') as f:
+                stat = os.fstat(f.fileno())
+                return json.load(f), (stat.st_ino, stat.st_size, stat.st_mtime_ns)
         except FileNotFoundError:
-            pass
-
-    def remove_past_temporary_events(self):
-        """Supprime les événements temporaires passés."""
-        current_datetime = datetime.now()
-        for day in self.schedule.keys():
-            self.schedule[day] = [
-                slot for slot in self.schedule[day]
-                if not (slot.is_temporary and
-                        datetime.combine(date.today(), slot.end_time) < current_datetime)
-            ]
-        self.save_schedule()
+            return None, None
+
+    def _apply(self, schedule_dict: dict):
+        """Remplace les créneaux en mémoire par ceux d'un contenu de fichier (verrou tenu par l'appelant)."""
+        self.granularity = schedule_dict.get("granularity", self.granularity)
+        self.slots_by_id.clear()
+        for day in self.schedule:
+            self.schedule[day] = [self._slot_from_dict(slot) for slot in schedule_dict.get(day, [])]
+            self.schedule[day].sort(key=lambda x: x.start_time)
+            for time_slot in self.schedule[day]:
+                self.slots_by_id[time_slot.id] = (day, time_slot)
+        self.weeks.clear()
+        self.week_slots_by_id.clear()
+        for week, stored in schedule_dict.get("weeks", {}).items():
+            overlay = self.weeks[week] = WeekOverlay()
+            overlay.cancelled = set(stored.get("cancelled", []))
+            for slot_dict in stored.get("added", []):
+                slot = self._slot_from_dict(slot_dict)
+                overlay.added.setdefault(slot_dict["day"], []).append(slot)
+                self.week_slots_by_id[slot.id] = (week, slot_dict["day"], slot)
+        self._resolved.clear()
+
+    def load_schedule(self):
+        """Charge l'emploi du temps depuis le fichier JSON."""
+        with self._lock:
+            schedule_dict, signature = self._read()
+            if schedule_dict is None:
+                return
+            self._apply(schedule_dict)
+            # Base des fusions : le contenu tel qu'il a été interprété, pas le fichier brut.
+            # Un ancien fichier (créneaux sans id) est réécrit tout de suite avec les ids attribués,
+            # sinon deux instances qui le chargent dupliqueraient chaque créneau en sauvegardant.
+            self._disk = (self._to_dict(), signature)
+            if self._disk[0] != schedule_dict:
+                self.save_schedule()
+
+    @staticmethod
+    def _by_id(schedule_dict: dict) -> dict:
+        """Créneaux d'un contenu de fichier indexés par id (le jour devient un champ du créneau)."""
+        slots = {"granularity": schedule_dict.get("granularity"), "weeks": {
+            week: {"added": {slot["id"]: slot for slot in stored.get("added", [])},
+                   "cancelled": {slot_id: True for slot_id in stored.get("cancelled", [])}}
+            for week, stored in schedule_dict.get("weeks", {}).items()
+        }}
+        for day, day_slots in schedule_dict.items():
+            if day not in ("granularity", "weeks"):
+                for slot in day_slots:
+                    slots[slot.get("id")] = dict(slot, day=day)
+        return slots
+
+    def _merge_external(self) -> bool:
+        """Fusionne créneau par créneau les changements d'une autre instance (verrous tenus par l'appelant)."""
+        base, signature = self._disk
+        if file_signature(self.file) == signature:
+            return False
+        remote, signature = self._read()
+        if remote is None:
+            return False
+        local = self._by_id(self._to_dict())
+        if not merge_into(local, self._by_id(base), self._by_id(remote)):
+            self._disk = (remote, signature)
+            return False
+        merged = {"granularity": local.pop("granularity") or self.granularity, "weeks": {
+            week: {"added": list(stored["added"].values()), "cancelled": list(stored["cancelled"])}
+            for week, stored in local.pop("weeks").items()
+        }}
+        for slot in local.values():
+            merged.setdefault(slot.pop("day"), []).append(slot)
+        self._apply(merged)
+        self._disk = (remote, signature)
+        return True
+
+    def reload_external(self):
+        """Intègre les créneaux écrits par une autre instance, s'il y en a."""
+        with self._lock:
+            with FileLock(self.file):
+                merged = self._merge_external()
+        if merged and self.on_external_change:
+            self.on_external_change()
+
+    def remove_past_temporary_events(self) -> bool:
+        """Supprime les événements temporaires passés ; retourne True s'il y en avait."""
+        with self._lock:
+            current_datetime = datetime.now()
+            removed = False
+            for day in self.schedule.keys():
+                kept = []
+                for slot in self.schedule[day]:
+                    if slot.is_temporary and datetime.combine(date.today(), slot.end_time) < current_datetime:
+                        self.slots_by_id.pop(slot.id, None)
+                        removed = True
+                    else:
+                        kept.append(slot)
+                self.schedule[day] = kept
+            if removed:
+                self._week_changed(None)
+            # Dans une semaine datée, un événement temporaire expire à la fin de son jour réel
+            for week, overlay in list(self.weeks.items()):
+                monday = date.fromisoformat(week)
+                for offset, day in enumerate(self.schedule):
+                    added = overlay.added.get(day, [])
+                    day_date = monday + timedelta(days=offset)
+                    expired = [slot for slot in added
+                               if slot.is_temporary and datetime.combine(day_date, slot.end_time) < current_datetime]
+                    if expired:
+                        for slot in expired:
+                            self.week_slots_by_id.pop(slot.id, None)
+                        overlay.added[day] = [slot for slot in added if slot not in expired]
+                        self._week_changed(week)
+                        removed = True
+            # Rien à écrire si aucun événement n'a expiré (cas de chaque ouverture de l'onglet)
+            if removed:
+                self.save_schedule()
+            return removed
 
 
 
@@ -150,6 +523,10 @@ def main(page: ft.Page):
     BACKGROUND_COLOR = ft.colors.WHITE
     TEXT_COLOR = ft.colors.GREY_900
 
+    # Profil utilisateur de la session (ex: http://hote:8550/?profil=alice en mode web)
+    profile = page.query.to_dict.get("profil") or DEFAULT_PROFILE
+    store = get_store()
+
     # Fonction pour créer le menu horizontal
     def create_horizontal_menu():
         return ft.Container(
@@ -160,7 +537,7 @@ def main(page: ft.Page):
                             ft.IconButton(
                                 icon=ft.icons.CHECKLIST,
                                 tooltip="Tâches",
-                                on_click=lambda e: task_tab(),
+                                on_click=lambda e: open_tab("tasks", task_tab),
                                 icon_size=24,
                                 style=ft.ButtonStyle(color=ft.colors.BLUE_500)
                             ),
@@ -173,7 +550,7 @@ def main(page: ft.Page):
                             ft.IconButton(
                                 icon=ft.icons.NOTE,
                                 tooltip="Notes",
-                                on_click=lambda e: notes_tab(),
+                                on_click=lambda e: open_tab("notes", notes_tab),
                                 icon_size=24,
                                 style=ft.ButtonStyle(color=ft.colors.BLUE_500)
                             ),
@@ -186,7 +563,7 @@ def main(page: ft.Page):
                             ft.IconButton(
                                 icon=ft.icons.SCHEDULE,
                                 tooltip="Planning",
-                                on_click=lambda e: schedule_tab(),
+                                on_click=lambda e: open_tab("schedule", schedule_tab),
                                 icon_size=24,
                                 style=ft.ButtonStyle(color=ft.colors.BLUE_500)
                             ),
@@ -194,12 +571,25 @@ def main(page: ft.Page):
                         ],
                         alignment=ft.MainAxisAlignment.CENTER
                     ),
+                    ft.Column(
+                        controls=[
+                            ft.IconButton(
+                                icon=ft.icons.VIEW_AGENDA,
+                                tooltip="Agenda",
+                                on_click=lambda e: open_tab("agenda", agenda_tab),
+                                icon_size=24,
+                                style=ft.ButtonStyle(color=ft.colors.BLUE_500)
+                            ),
+                            ft.Text("Agenda", size=12, color=ft.colors.BLACK54)
+                        ],
+                        alignment=ft.MainAxisAlignment.CENTER
+                    ),
                     ft.Column(
                         controls=[
                             ft.IconButton(
                                 icon=ft.icons.CALENDAR_MONTH,
                                 tooltip="Calendrier",
-                                on_click=lambda e: calendar_tab(),
+                                on_click=lambda e: open_tab("calendar", calendar_tab),
                                 icon_size=24,
                                 style=ft.ButtonStyle(color=ft.colors.BLUE_500)
                             ),
@@ -218,95 +608,375 @@ def main(page: ft.Page):
             shadow=ft.BoxShadow(spread_radius=2, blur_radius=4, color=ft.colors.BLACK12)
         )
 
-    # Fonction pour afficher un contenu avec le menu horizontal
-    def show_with_menu(content):
-        page.controls.clear()
-        page.controls.append(create_horizontal_menu())
-        page.controls.append(ft.Divider(height=10, color=ft.colors.TRANSPARENT))
-        page.controls.append(content)
+    # Vue actuellement affichée par la session, les données qu'elle montre et sa fonction de rafraîchissement
+    current_refresh = {"callback": None, "topics": set()}
+
+    # Onglets déjà construits : leur contenu reste dans la page, seul l'onglet courant est visible.
+    # Un onglet masqué n'est pas rafraîchi à chaque changement : il est marqué périmé et
+    # rafraîchi une seule fois, quand il est réaffiché.
+    tab_views = {}
+    current_tab = {"name": None}
+
+    def watch(topics, refresh=None):
+        """Déclare les données affichées par la session pour ne recevoir que leurs changements."""
+        current_refresh["topics"] = set(topics)
+        current_refresh["callback"] = refresh
+        # Les onglets masqués restent abonnés pour savoir qu'ils sont périmés
+        subscription.topics = set(topics).union(*(view["topics"] for view in tab_views.values()))
+
+    def mark_stale(topics):
+        """Marque périmés les onglets qui affichent ces données, sauf la vue rafraîchie à l'instant."""
+        for view in tab_views.values():
+            if view["topics"] & set(topics) and view["refresh"] is not current_refresh["callback"]:
+                view["stale"] = True
+
+    def display_tab(name):
+        view = tab_views[name]
+        current_tab["name"] = name
+        typing["field"] = None  # Le champ quitté ne reçoit pas toujours on_blur
+        welcome_text.visible = False
+        for tab_name, other in tab_views.items():
+            other["content"].visible = tab_name == name
+        watch(view["topics"], view["refresh"])
+        if view["stale"] or (view["on_show"] and view["on_show"]()):
+            view["stale"] = False
+            view["refresh"]()
         page.update()
-    # Fonction pour sauvegarder les données de manière sécurisée
-    def save_data(file="data.json"):
-        try:
-            with open(file, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            page.snack_bar = ft.SnackBar(ft.Text(f"Erreur de sauvegarde des données : {e}"))
-            page.snack_bar.open = True
+
+    def open_tab(name, build):
+        """Affiche un onglet : construit à la première visite, simplement réaffiché ensuite."""
+        if name in tab_views:
+            display_tab(name)
+        else:
+            build()
+
+    def resume_tab():
+        """Revient à la vue principale de l'onglet courant après une sous-vue (liste, note)."""
+        display_tab(current_tab["name"])
+
+    def show_with_menu(name, content, topics=(), refresh=None, on_show=None):
+        """Ajoute la vue construite d'un onglet à la page et l'affiche.
+
+        on_show() est appelé à chaque réaffichage et retourne True si la vue
+        doit être rafraîchie (données qui dépendent de l'heure).
+        """
+        tab_views[name] = {"content": content, "topics": set(topics), "refresh": refresh or (lambda: None),
+                           "on_show": on_show, "stale": False}
+        page.controls.append(content)
+        display_tab(name)
+
+    # Menu et message d'accueil : construits une seule fois
+    welcome_text = ft.Text("Sélectionnez une fonctionnalité dans le menu déroulant.", color=TEXT_COLOR, text_align="center")
+    page.controls.extend([create_horizontal_menu(), ft.Divider(height=10, color=ft.colors.TRANSPARENT), welcome_text])
+
+    def update_controls(*controls):
+        """Envoie les changements de ces seuls contrôles, sans parcourir les onglets masqués.
+
+        Un contrôle pas encore affiché n'a pas d'identifiant : toute la page est alors mise à jour.
+        """
+        if all(control.uid for control in controls):
+            page.update(*controls)
+        else:
             page.update()
 
-    # Fonction pour charger les données avec gestion des erreurs
-    def load_data(file="data.json"):
-        if os.path.exists(file):
+    def show_snack_bar(message):
+        page.snack_bar = ft.SnackBar(ft.Text(message))
+        page.snack_bar.open = True
+        page.update()
+
+    # Export en arrière-plan : les générateurs écrivent le fichier au fil de l'eau.
+    # Ils doivent porter sur une copie prise sous store.lock : le thread d'export ne prend pas le verrou.
+    def export_in_background(chunks, file):
+        def run():
             try:
-                with open(file, "r", encoding="utf-8") as f:
-                    return json.load(f)
+                size = write_stream(chunks, file)
+                show_snack_bar(f"Export terminé : {file} ({size} octets)")
             except Exception as e:
-                page.snack_bar = ft.SnackBar(ft.Text(f"Erreur de chargement des données : {e}"))
-                page.snack_bar.open = True
-                page.update()
-        return {"task_lists": {}, "notes": {}, "schedule": {}, "events": []}
-        # Initialisation des données
-    data = load_data("data.json")
-    # Fonction pour gérer les notifications avec une meilleure gestion des ressources
-    def notification_checker():
-        try:
-            while True:
-                now = datetime.now()
-                check_notifications(now)
-                tm.sleep(60)
-        except Exception as e:
-            page.overlay.append(ft.Text(f"Erreur dans le système de notifications : {e}"))
-            page.open = True
-            page.update()
+                show_snack_bar(f"Erreur lors de l'export : {e}")
+        threading.Thread(target=run, daemon=True).start()
 
-    # Fonction pour vérifier les notifications des tâches et événements
-    def check_notifications(now):
-        try:
-            # Vérification des tâches
-            for task_list in data["task_lists"].values():
-                for task in task_list["tasks"]:
-                    check_task_notification(task, now)
-            # Vérification des événements
-            for event in data["events"]:
-                check_event_notification(event, now)
-        except Exception as e:
-            page.snack_bar = ft.SnackBar(ft.Text(f"Erreur lors de la vérification des notifications : {e}"))
-            page.snack_bar.open = True
-            page.update()
+    # Historique d'annulation de la session : opérations inverses, pas de copies des données
+    history = History()
 
-    # Fonction pour vérifier et envoyer une notification pour une tâche
-    def check_task_notification(task, now):
-        try:
-            task_time = datetime.strptime(task["time"], "%Y-%m-%d %H:%M")
-            if task_time <= now and not task.get("notified", False):
-                page.snack_bar = ft.SnackBar(ft.Text(f"Rappel Tâche: {task['title']}"))
-                page.snack_bar.open = True
-                task["notified"] = True
-                save_data()
-        except ValueError:
-            return  # Si le format de date/heure est incorrect, on l'ignore, mais on pourrait aussi alerter l'utilisateur
+    def record_undo(operation):
+        history.record(operation)
+        page.snack_bar = ft.SnackBar(ft.Text(operation.label), action="Annuler", on_action=lambda e: undo_last())
+        page.snack_bar.open = True
+        page.update()
 
-    # Fonction pour vérifier et envoyer une notification pour un événement
-    def check_event_notification(event, now):
-        try:
-            event_date = datetime.strptime(event["date"], "%Y-%m-%d")
-            if event_date.date() == now.date() and not event.get("notified", False):
-                page.snack_bar = ft.SnackBar(ft.Text(f"Rappel Événement: {event['title']}"))
-                page.snack_bar.open = True
-                event["notified"] = True
-                save_data()
-        except ValueError:
-            return  # Gestion du mauvais format de date
+    def apply_history(step, failure_message):
+        # Les opérations inverses modifient les données partagées : même verrou que save_data
+        with store.lock:
+            operation = step()
+        if operation is None:
+            show_snack_bar(failure_message)
+            return
+        # Même chemin qu'une modification ordinaire : sauvegarde, diffusion, rafraîchissement de la vue
+        if operation.topic == "schedule":
+            store.publish(profile, ["schedule"], origin=subscription)
+            mark_stale(["schedule"])
+        else:
+            save_data(operation.topic)
+        if operation.topic in current_refresh["topics"] and current_refresh["callback"]:
+            current_refresh["callback"]()
+
+    def undo_last():
+        apply_history(history.undo, "Rien à annuler")
+
+    def redo_last():
+        apply_history(history.redo, "Rien à rétablir")
+
+    # Champ de saisie qui a le focus : Ctrl+Z / Ctrl+Y y corrigent la frappe, pas les données
+    typing = {"field": None}
+
+    def track_typing(*fields):
+        def on_focus(e):
+            typing["field"] = e.control
+
+        def on_blur(e):
+            if typing["field"] is e.control:
+                typing["field"] = None
+
+        for text_field in fields:
+            text_field.on_focus = on_focus
+            text_field.on_blur = on_blur
+
+    def on_keyboard(e: ft.KeyboardEvent):
+        if not e.ctrl or typing["field"] is not None or (page.dialog is not None and page.dialog.open):
+            return
+        if e.key.upper() == "Z" and not e.shift:
+            undo_last()
+        elif e.key.upper() == "Y" or (e.key.upper() == "Z" and e.shift):
+            redo_last()
+
+    page.on_keyboard_event = on_keyboard
+
+    # Renommer une liste ou une note : seul le titre change, l'identifiant reste le même
+    def show_rename_dialog(entity, topic, on_done):
+        title_field = ft.TextField(label="Nouveau titre", value=entity["title"], expand=True)
+
+        def rename():
+            title = title_field.value.strip()
+            if not title:
+                show_snack_bar("Le titre ne peut pas être vide")
+                return
+
+            def change():
+                # Même règle qu'à la création : deux listes (ou deux notes) ne partagent pas un titre
+                if any(other is not entity and other["title"] == title for other in data[topic].values()):
+                    return False
+                entity["title"] = title
+                return True
+
+            if not save_data(topic, change):
+                show_snack_bar("Une liste avec ce titre existe déjà" if topic == "task_lists"
+                               else "Une note avec ce titre existe déjà")
+                return
+            page.dialog.open = False
+            on_done()
+
+        page.dialog = ft.AlertDialog(
+            title=ft.Text("Renommer", size=18, weight="bold"),
+            content=ft.Column([title_field]),
+            actions=[
+                ft.TextButton("Annuler", on_click=lambda e: close_rename_dialog(), style=ft.ButtonStyle(color=ft.colors.RED)),
+                ft.TextButton("Renommer", on_click=lambda e: rename(), style=ft.ButtonStyle(bgcolor=ft.colors.BLUE, color=ft.colors.WHITE))
+            ]
+        )
+        page.dialog.open = True
+        page.update()
+
+    def close_rename_dialog():
+        page.dialog.open = False
+        page.update()
+
+    # Fonction pour sauvegarder les données de manière sécurisée
+    def save_data(topic=None, change=None):
+        """Applique change() puis sauvegarde, le tout sous le verrou du magasin ; retourne le résultat de change().
+
+        Les autres sessions, les rappels, l'archivage, la synchronisation et
+        les fusions parcourent les mêmes dictionnaires sous ce verrou : toute
+        modification des données partagées passe par ici.
+        """
+        error = None
+        with store.lock:
+            result = change() if change else None
+            try:
+                store.save(profile)
+            except Exception as e:
+                error = e
+        if error is not None:
+            show_snack_bar(f"Erreur de sauvegarde des données : {error}")
+            return result
+        if topic:
+            store.publish(profile, [topic], origin=subscription)
+            mark_stale([topic])
+        return result
+
+    # Fonction pour charger les données avec gestion des erreurs
+    def load_data():
+        return store.get(profile, on_error=lambda e: show_snack_bar(f"Erreur de chargement des données : {e}"))
 
-    # Démarrer le thread des notifications
-    threading.Thread(target=notification_checker, daemon=True).start()
+    # Initialisation des données (partagées avec les autres sessions du même profil)
+    data = load_data()
+
+    # Changement fait par une autre session sur des données affichées ici
+    def on_external_change(topics):
+        mark_stale(topics)
+        if current_refresh["topics"] & topics and current_refresh["callback"]:
+            current_refresh["callback"]()
+
+    # Panneau des rappels : les lots reçus s'y ajoutent tant qu'il reste ouvert
+    reminder_count = ft.Text("", size=16, weight="bold")
+    reminder_list = ft.Column(spacing=0, scroll=ft.ScrollMode.AUTO)
+    reminder_state = {"total": 0}
+
+    def close_reminders():
+        reminder_panel.open = False
+        page.update()
+
+    reminder_panel = ft.BottomSheet(
+        ft.Container(
+            ft.Column([
+                ft.Row([reminder_count, ft.IconButton(icon=ft.icons.CLOSE, on_click=lambda e: close_reminders())],
+                       alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                reminder_list
+            ], tight=True),
+            padding=20
+        )
+    )
+    page.overlay.append(reminder_panel)
+
+    def show_reminders(messages, dropped):
+        if not reminder_panel.open:
+            reminder_list.controls.clear()
+            reminder_state["total"] = 0
+        reminder_state["total"] += len(messages) + dropped
+        for message in messages:
+            reminder_list.controls.append(ft.ListTile(leading=ft.Icon(ft.icons.NOTIFICATIONS), title=ft.Text(message, size=14), dense=True))
+        # Seuls les derniers rappels restent listés, le compteur garde le total
+        del reminder_list.controls[:-REMINDER_QUEUE_SIZE]
+        hidden = reminder_state["total"] - len(reminder_list.controls)
+        if hidden > 0:
+            reminder_list.controls.insert(0, ft.Text(f"... et {hidden} rappel(s) plus ancien(s)", italic=True, color=ft.colors.GREY_600))
+        reminder_list.height = min(300, 48 * len(reminder_list.controls))
+        reminder_count.value = f"{reminder_state['total']} rappel(s)"
+        reminder_panel.open = True
+        page.update()
+
+    subscription = Subscription(profile, on_external_change, on_reminder=show_reminders)
+    unsubscribe = store.subscribe(subscription)
+    page.on_close = lambda e: unsubscribe()
+
+    # Les rappels sont vérifiés par un seul thread pour toutes les sessions
+    get_scheduler().start()
+
+    # Écritures d'une autre fenêtre ou d'un autre serveur sur le même fichier : fusionnées dès leur arrivée
+    store.watch(profile)
+
+    # Synchronisation des calendriers externes, en arrière-plan et une seule fois par profil
+    sync_engine = store.shared(profile, "sync", lambda: SyncEngine(store, profile))
+    if data.get("calendars"):
+        sync_engine.start()
+
+    # Compteurs de tâches partagés par les sessions du profil, tenus à jour à chaque modification
+    def create_task_stats():
+        stats = TaskStats.build(data["task_lists"])
+
+        # Tâches modifiées par une autre instance : les compteurs sont recalculés une fois par fusion
+        def on_merge(keys):
+            if "task_lists" in keys:
+                stats.rebuild(data["task_lists"])
+
+        store.on_merge(profile, on_merge)
+        return stats
+
+    task_stats = store.shared(profile, "task_stats", create_task_stats)
+
+    # Contenu des notes, hors de data.json : sauvegardé par correctifs et stocké par morceaux
+    def create_note_store():
+        notes = NoteStore(profile)
+        notes.prune(data["notes"])
+        return notes
+
+    note_store = store.shared(profile, "notes", create_note_store)
+
+    # Archivage en arrière-plan des tâches terminées et des événements passés (partitions mensuelles)
+    archive = store.shared(profile, "archive", lambda: Archive(profile))
+    archiver = store.shared(profile, "archiver",
+                            lambda: Archiver(store, profile, archive, on_task_archived=task_stats.remove_task))
+    archiver.start()
 
     # Fonctionnalité Liste de tâches
     def task_tab():
         task_lists_view = ft.Column(expand=True, spacing=10,scroll=ft.ScrollMode.AUTO)
         new_list_title = ft.TextField(label="Titre de la nouvelle liste", expand=True, border_radius=8, border_color=ft.colors.BLUE_200)
         add_list_button = ft.ElevatedButton(text="Ajouter une liste de tâches", on_click=lambda e: show_new_list_fields(), bgcolor=ft.colors.BLUE, color=ft.colors.WHITE)
+        summary_text = ft.Text("", size=14, color=ft.colors.BLACK54)
+        export_button = ft.IconButton(
+            icon=ft.icons.DOWNLOAD,
+            tooltip="Exporter les tâches (CSV)",
+            on_click=lambda e: export_tasks()
+        )
+
+        archive_button = ft.IconButton(
+            icon=ft.icons.MANAGE_SEARCH,
+            tooltip="Rechercher dans les archives",
+            on_click=lambda e: show_archive_search()
+        )
+
+        def show_archive_search():
+            """Recherche par titre dans les tâches terminées et les événements archivés (lecture seule)."""
+            search_field = ft.TextField(label="Titre contient", expand=True, autofocus=True,
+                                        on_submit=lambda e: search())
+            results = ft.Column(spacing=4, scroll=ft.ScrollMode.AUTO, height=300)
+
+            def describe(item):
+                if "list_id" in item:
+                    return f"{item.get('completed_at') or item.get('time', '')} — {item['title']} ({item.get('list_title', '')})"
+                return f"{item['date']} {item.get('time', '')} — {item['title']} (calendrier)"
+
+            def search():
+                text = search_field.value.strip()
+                if not text:
+                    return
+                # Les partitions sont lues mois par mois : on s'arrête dès que la page de résultats est pleine
+                found = list(islice(archive.search(text), ARCHIVE_SEARCH_LIMIT))
+                results.controls = [ft.Text(describe(item), size=13) for item in found]
+                if not found:
+                    results.controls.append(ft.Text("Aucun résultat.", color=ft.colors.BLACK54))
+                elif len(found) == ARCHIVE_SEARCH_LIMIT:
+                    results.controls.append(ft.Text(f"{ARCHIVE_SEARCH_LIMIT} premiers résultats ; précisez la recherche.",
+                                                    color=ft.colors.BLACK54))
+                page.update()
+
+            page.dialog = ft.AlertDialog(
+                title=ft.Text("Archives", size=18, weight="bold"),
+                content=ft.Column([ft.Row([search_field, ft.IconButton(icon=ft.icons.SEARCH, on_click=lambda e: search())]),
+                                   results], tight=True, width=500),
+                actions=[ft.TextButton("Fermer", on_click=lambda e: close_dialog())],
+            )
+            page.dialog.open = True
+            page.update()
+
+        def export_tasks():
+            # Seuls les identifiants sont relevés d'un coup : chaque tâche est copiée sous le verrou
+            # au moment où elle est écrite, sans bloquer les autres sessions pendant tout l'export
+            with store.lock:
+                keys = [(list_id, task_id) for list_id, task_list in data["task_lists"].items()
+                        for task_id in task_list["tasks"]]
+
+            def items():
+                for list_id, task_id in keys:
+                    with store.lock:
+                        task_list = data["task_lists"].get(list_id)
+                        task = task_list["tasks"].get(task_id) if task_list else None
+                        if task is None:
+                            continue  # Supprimée depuis le début de l'export
+                        item = (task_list["title"], dict(task))
+                    yield item
+
+            export_in_background(tasks_csv(items=items()), f"taches_{profile}.csv")
 
         def show_new_list_fields():
             new_list_title.value = ""
@@ -333,62 +1003,116 @@ def main(page: ft.Page):
                 page.snack_bar.open = True
                 page.update()
                 return
-            if title in data["task_lists"]:
+
+            def change():
+                if any(task_list["title"] == title for task_list in data["task_lists"].values()):
+                    return False
+                list_id = new_id()
+                data["task_lists"][list_id] = {"id": list_id, "title": title, "tasks": {}}
+                task_stats.add_list(list_id)
+                return True
+
+            if not save_data("task_lists", change):
                 page.snack_bar = ft.SnackBar(ft.Text("Une liste avec ce titre existe déjà"))
                 page.snack_bar.open = True
                 page.update()
                 return
-            data["task_lists"][title] = {"tasks": []}
-            save_data()
             refresh_task_lists()
             close_dialog()
 
         def refresh_task_lists():
-            task_lists_view.controls.clear()
-            for title in data["task_lists"]:
-                task_lists_view.controls.append(create_task_list_tile(title))
-                print(title)
-            page.update()
+            # Les compteurs sont partagés par toutes les sessions : avancés et lus sous le même verrou
+            with store.lock:
+                task_stats.advance(datetime.now())
+                totals = task_stats.totals()
+                tiles = [create_task_list_tile(list_id) for list_id in data["task_lists"]]
+            summary_text.value = (f"{totals['total']} tâches · {totals['completed']} terminées · "
+                                  f"{totals['overdue']} en retard · {totals['due_today']} aujourd'hui")
+            task_lists_view.controls = tiles
+            update_controls(summary_text, task_lists_view)
+
+        def create_badge(value, label, color):
+            return ft.Container(
+                content=ft.Text(f"{value} {label}", size=11, color=ft.colors.WHITE),
+                bgcolor=color,
+                border_radius=ft.border_radius.all(10),
+                padding=ft.padding.symmetric(horizontal=8, vertical=2)
+            )
 
-        def create_task_list_tile(title):
+        def create_task_list_tile(list_id):
+            title = data["task_lists"][list_id]["title"]
+            counts = task_stats.for_list(list_id)
+            badges = [create_badge(f"{counts['completed']}/{counts['total']}", "terminées", ft.colors.BLUE_GREY_400)]
+            if counts["overdue"]:
+                badges.append(create_badge(counts["overdue"], "en retard", ft.colors.RED_400))
+            if counts["due_today"]:
+                badges.append(create_badge(counts["due_today"], "aujourd'hui", ft.colors.ORANGE_400))
             return ft.ListTile(
                     title=ft.Text(title, size=16, weight="bold", color=ft.colors.BLACK, max_lines=1),
-                    on_click=lambda e: open_task_list(title),
-                    trailing=ft.IconButton(
-                        icon=ft.icons.DELETE,
-                        on_click=lambda e, t=title: delete_task_list(t),
-                        icon_size=18,
-                        bgcolor=ft.colors.RED
-
-                    )
+                    subtitle=ft.Row(badges, spacing=5),
+                    on_click=lambda e: open_task_list(list_id),
+                    trailing=ft.Row([
+                        ft.IconButton(
+                            icon=ft.icons.EDIT,
+                            tooltip="Renommer",
+                            on_click=lambda e: show_rename_dialog(data["task_lists"][list_id], "task_lists", refresh_task_lists),
+                            icon_size=18
+                        ),
+                        ft.IconButton(
+                            icon=ft.icons.DELETE,
+                            on_click=lambda e, l=list_id: delete_task_list(l),
+                            icon_size=18,
+                            bgcolor=ft.colors.RED
+                        )
+                    ], tight=True, spacing=0)
 
                 )
 
         
 
-        def delete_task_list(title):
-            del data["task_lists"][title]
-            save_data()
-            refresh_task_lists()
+        def delete_task_list(list_id):
+            def change():
+                task_list = data["task_lists"].pop(list_id, None)
+                if task_list is not None:
+                    task_stats.remove_list(list_id, task_list["tasks"].values())
+                return task_list
 
-        def open_task_list(title):
-            task_list = data["task_lists"][title]
+            task_list = save_data("task_lists", change)
+            refresh_task_lists()
+            if task_list is None:
+                return  # Déjà supprimée par une autre session
+
+            def restore_stats():
+                task_stats.add_list(list_id)
+                for task in task_list["tasks"].values():
+                    task_stats.add_task(list_id, task)
+
+            record_undo(dict_removal(
+                f"Liste « {task_list['title']} » supprimée", "task_lists", data["task_lists"], list_id, task_list,
+                on_restore=restore_stats,
+                on_remove=lambda: task_stats.remove_list(list_id, task_list["tasks"].values())
+            ))
+
+        def open_task_list(list_id):
+            task_list = data["task_lists"][list_id]
+            title = task_list["title"]
             task_view = ft.Column(expand=True, spacing=10,scroll=ft.ScrollMode.AUTO)
             task_title = ft.TextField(label="Titre de la tâche", expand=True, border_radius=8, border_color=ft.colors.BLUE_200)
             task_time = ft.TextField(label="Heure (YYYY-MM-DD HH:MM)", expand=True, border_radius=8, border_color=ft.colors.BLUE_200)
+            track_typing(task_title, task_time)
 
             def refresh_tasks():
-                task_view.controls.clear()
-                for task in task_list["tasks"]:
-                    task_view.controls.append(create_task_tile(task, task_list))
-                page.update()
+                with store.lock:
+                    tiles = [create_task_tile(task, task_list) for task in task_list["tasks"].values()]
+                task_view.controls = tiles
+                update_controls(task_view)
 
             def create_task_tile(task, task_list):
                 return ft.ListTile(
-                    leading=ft.Checkbox(value=task.get("completed", False), on_change=lambda e: toggle_task_completion(task)),
+                    leading=ft.Checkbox(value=task.get("completed", False), on_change=lambda e, task_id=task["id"]: toggle_task_completion(task_id)),
                     title=ft.Text(task["title"], size=14),
                     subtitle=ft.Text(task["time"], size=12),
-                    trailing=ft.IconButton(icon=ft.icons.DELETE, on_click=lambda e, t=task: delete_task(task, task_list), icon_size=18, bgcolor=ft.colors.RED),
+                    trailing=ft.IconButton(icon=ft.icons.DELETE, on_click=lambda e, task_id=task["id"]: delete_task(task_id), icon_size=18, bgcolor=ft.colors.RED),
 
                 )
 
@@ -403,22 +1127,50 @@ def main(page: ft.Page):
                     page.update()
                     return
 
-                task = {"title": title, "time": time, "notified": False, "completed": False}
-                task_list["tasks"].append(task)
-                save_data()
+                task = {"id": new_id(), "title": title, "time": time, "notified": False, "completed": False}
+
+                def change():
+                    task_list["tasks"][task["id"]] = task
+                    task_stats.add_task(list_id, task)
+
+                save_data("task_lists", change)
                 refresh_tasks()
                 task_title.value = ""
                 task_time.value = ""
-                page.update()
+                update_controls(task_title, task_time)
 
-            def delete_task(task, task_list):
-                task_list["tasks"].remove(task)
-                save_data()
-                refresh_tasks()
+            def delete_task(task_id):
+                def change():
+                    task = task_list["tasks"].pop(task_id, None)
+                    if task is not None:
+                        task_stats.remove_task(task)
+                    return task
 
-            def toggle_task_completion(task):
-                task["completed"] = not task.get("completed", False)
-                save_data()
+                task = save_data("task_lists", change)
+                refresh_tasks()
+                if task is None:
+                    return
+                record_undo(dict_removal(
+                    f"Tâche « {task['title']} » supprimée", "task_lists", task_list["tasks"], task_id, task,
+                    on_restore=lambda: task_stats.add_task(list_id, task),
+                    on_remove=lambda: task_stats.remove_task(task),
+                    attached=lambda: data["task_lists"].get(list_id) is task_list
+                ))
+
+            def toggle_task_completion(task_id):
+                def change():
+                    task = task_list["tasks"].get(task_id)
+                    if task is None:
+                        return
+                    task["completed"] = not task.get("completed", False)
+                    # Date de complétion utilisée par l'archivage
+                    if task["completed"]:
+                        task["completed_at"] = datetime.now().strftime("%Y-%m-%d %H:%M")
+                    else:
+                        task.pop("completed_at", None)
+                    task_stats.update_completion(task)
+
+                save_data("task_lists", change)
                 refresh_tasks()
 
             page.views.append(
@@ -440,21 +1192,32 @@ def main(page: ft.Page):
                 )
             )
             refresh_tasks()
+            watch(["task_lists"], refresh_tasks)
             page.go("/tasks")
 
         def go_back():
             if len(page.views) > 1:
                 page.views.pop()
+                # Les badges des listes reflètent les tâches modifiées entre-temps (vue marquée périmée)
+                resume_tab()
                 page.go(page.views[-1].route)
 
+        def counters_changed():
+            # Tâches passées en retard ou changement de jour depuis le dernier affichage
+            with store.lock:
+                before = task_stats.totals()
+                task_stats.advance(datetime.now())
+                return task_stats.totals() != before
+
         refresh_task_lists()
 
-        show_with_menu(ft.Column([
+        show_with_menu("tasks", ft.Column([
             ft.Divider(),
-            add_list_button,
+            ft.Row([add_list_button, archive_button, export_button]),
             ft.Text("Listes de tâches:", style="headlineSmall", size=18),
+            summary_text,
             task_lists_view
-        ], expand=True, scroll=ft.ScrollMode.AUTO,spacing=20))
+        ], expand=True, scroll=ft.ScrollMode.AUTO,spacing=20), ["task_lists"], refresh_task_lists, counters_changed)
 
     # Fonctionnalité Bloc-notes
     def notes_tab():
@@ -483,38 +1246,50 @@ def main(page: ft.Page):
         def add_note():
             title = new_note_title.value.strip()
             if title:
-                if title in data["notes"]:
+                def change():
+                    if any(note["title"] == title for note in data["notes"].values()):
+                        return False
+                    note_id = new_id()
+                    data["notes"][note_id] = {"id": note_id, "title": title}
+                    return True
+
+                if save_data("notes", change):
+                    refresh_notes_list()
+                    close_dialog()
+                else:
                     page.snack_bar = ft.SnackBar(ft.Text("Une note avec ce titre existe déjà"))
                     page.snack_bar.open = True
                     page.update()
-                else:
-                    data["notes"][title] = ""
-                    save_data()
-                    refresh_notes_list()
-                    close_dialog()
             else:
                 page.snack_bar = ft.SnackBar(ft.Text("Le titre ne peut pas être vide"))
                 page.snack_bar.open = True
                 page.update()
 
         def refresh_notes_list():
-            notes_list_view.controls.clear()
-            for title in data["notes"]:
-                notes_list_view.controls.append(create_note_tile(title))
-            page.update()
+            with store.lock:
+                tiles = [create_note_tile(note_id) for note_id in data["notes"]]
+            notes_list_view.controls = tiles
+            update_controls(notes_list_view)
 
-        def create_note_tile(title):
+        def create_note_tile(note_id):
+            note = data["notes"][note_id]
             return ft.Row(
                 [
                     ft.Container(
-                        content=ft.Text(title, size=16, weight="bold", color=ft.colors.BLACK, max_lines=1),
-                        on_click=lambda e: open_note(title),  # Appel de la fonction d'ouverture au clic
+                        content=ft.Text(note["title"], size=16, weight="bold", color=ft.colors.BLACK, max_lines=1),
+                        on_click=lambda e: open_note(note_id),  # Appel de la fonction d'ouverture au clic
                         padding=ft.padding.all(10),
                         expand=True  # Permet au texte de s'étendre dans le Row
                     ),
+                    ft.IconButton(
+                        icon=ft.icons.EDIT,
+                        tooltip="Renommer",
+                        on_click=lambda e: show_rename_dialog(note, "notes", refresh_notes_list),
+                        icon_size=18
+                    ),
                     ft.IconButton(
                         icon=ft.icons.DELETE,
-                        on_click=lambda e: delete_note(title),
+                        on_click=lambda e: delete_note(note_id),
                         icon_size=18,
                         bgcolor=ft.colors.RED
 
@@ -524,29 +1299,62 @@ def main(page: ft.Page):
                 spacing=10,scroll=ft.ScrollMode.AUTO
             )
 
-        def delete_note(title):
-            del data["notes"][title]
-            save_data()
+        def delete_note(note_id):
+            note = save_data("notes", lambda: data["notes"].pop(note_id, None))
             refresh_notes_list()
+            if note is None:
+                return  # Déjà supprimée par une autre session
+            record_undo(dict_removal(f"Note « {note['title']} » supprimée", "notes", data["notes"], note_id, note))
 
-        def open_note(title):
+        def open_note(note_id):
+            note = data["notes"][note_id]
+            title = note["title"]
             note_content = ft.TextField(
                 label="Contenu de la note",
                 multiline=True,
                 expand=True,
-                value=data["notes"][title],
+                value=note_store.content(note),
                 keyboard_type=ft.KeyboardType.TEXT,
                 border_radius=8,
                 border_color=ft.colors.BLUE_200,
-                height=300
+                height=300,
+                on_change=lambda e: schedule_autosave()
             )
+            track_typing(note_content)
+            save_status = ft.Text("", size=12, color=ft.colors.GREY_600)
+            autosave = {"timer": None}
+
+            def schedule_autosave():
+                # Chaque frappe repousse la sauvegarde : rien n'est écrit tant que l'utilisateur tape
+                if autosave["timer"]:
+                    autosave["timer"].cancel()
+                autosave["timer"] = threading.Timer(AUTOSAVE_DELAY, flush_note)
+                autosave["timer"].daemon = True
+                autosave["timer"].start()
+
+            def flush_note():
+                if autosave["timer"]:
+                    autosave["timer"].cancel()
+                    autosave["timer"] = None
+                try:
+                    # Seul le correctif depuis la dernière sauvegarde est écrit ; data.json n'est réécrit
+                    # qu'une fois, quand une ancienne note quitte data.json
+                    with store.lock:
+                        migrated = note_store.save(note, note_content.value or "")
+                    if migrated:
+                        save_data("notes")
+                except Exception as e:
+                    show_snack_bar(f"Erreur de sauvegarde de la note : {e}")
+                    return False
+                save_status.value = f"Enregistrée à {datetime.now().strftime('%H:%M:%S')}"
+                page.update()
+                return True
 
             def save_note_content(e):
-                data["notes"][title] = note_content.value
-                save_data()
-                page.snack_bar = ft.SnackBar(ft.Text("Note sauvegardée"))
-                page.snack_bar.open = True
-                page.update()
+                if flush_note():
+                    page.snack_bar = ft.SnackBar(ft.Text("Note sauvegardée"))
+                    page.snack_bar.open = True
+                    page.update()
 
             page.views.append(
                 ft.View(
@@ -558,52 +1366,86 @@ def main(page: ft.Page):
                         ),
                         ft.Column([
                             note_content,
-                            ft.ElevatedButton(text="Sauvegarder la note", on_click=save_note_content, bgcolor=ft.colors.BLUE, color=ft.colors.WHITE)
+                            ft.Row([
+                                ft.ElevatedButton(text="Sauvegarder la note", on_click=save_note_content, bgcolor=ft.colors.BLUE, color=ft.colors.WHITE),
+                                save_status
+                            ], spacing=10)
                         ], expand=True, scroll=ft.ScrollMode.AUTO,spacing=10)
                     ]
                 )
             )
+            # Pas de rafraîchissement automatique pour ne pas écraser la saisie en cours
+            watch([])
+            pending_note["flush"] = lambda: autosave["timer"] and flush_note()
             page.go("/note")
 
+        # Sauvegarde en attente de la note ouverte, faite avant de la quitter
+        pending_note = {"flush": None}
+
         def go_back():
+            if pending_note["flush"]:
+                pending_note["flush"]()
+                pending_note["flush"] = None
             if len(page.views) > 1:
                 page.views.pop()
+                resume_tab()
                 page.go(page.views[-1].route)
 
         refresh_notes_list()
 
-        show_with_menu(ft.Column([
+        show_with_menu("notes", ft.Column([
             ft.Divider(),
             add_note_button,
             ft.Text("Notes:", style="headlineSmall", size=18),
             notes_list_view
-        ], expand=True, scroll=ft.ScrollMode.AUTO, spacing=20))
+        ], expand=True, scroll=ft.ScrollMode.AUTO, spacing=20), ["notes"], refresh_notes_list)
+
+    def create_schedule_manager():
+        manager = ScheduleManager(schedule_file(profile),
+                                  on_external_change=lambda: store.publish(profile, ["schedule"]), lock=store.lock)
+        FileWatcher([manager.file], lambda path: manager.reload_external()).start()
+        return manager
 
     # Fonctionnalité Emploi du Temps
     def schedule_tab():
-        schedule_manager = ScheduleManager()
-
-        def time_str_to_time(time_str: str) -> Optional[time]:
-            """Convertit des chaînes comme '6h', '6h30', '6h00', '7', '7h' en objet time."""
-            time_str = time_str.strip()
-            time_str = time_str.replace('h', ':')
-            if time_str.endswith(':'):
-                time_str += '00'
-            try:
-                return datetime.strptime(time_str, '%H:%M').time()
-            except ValueError:
-                try:
-                    return datetime.strptime(time_str, '%H').time()
-                except ValueError:
-                    return None
+        # Un seul gestionnaire par profil, partagé par toutes les sessions
+        schedule_manager = store.shared(profile, "schedule", create_schedule_manager)
+        schedule_manager.remove_past_temporary_events()
+
+        def remove_expired():
+            # Événements temporaires passés depuis le dernier affichage de l'onglet
+            if not schedule_manager.remove_past_temporary_events():
+                return False
+            store.publish(profile, ["schedule"], origin=subscription)
+            return True
+
+        # Semaine affichée : None pour la semaine type, sinon le lundi d'une semaine datée
+        displayed = {"week": None}
+
+        def show_week(week: Optional[str]):
+            displayed["week"] = week
+            refresh_schedule()
+
+        def shift_week(weeks: int):
+            monday = date.fromisoformat(displayed["week"] or week_key(date.today()))
+            show_week(week_key(monday + timedelta(weeks=weeks)))
 
         def refresh_schedule():
             """Rafraîchit l'affichage de l'emploi du temps."""
             time_slots = schedule_manager.time_slots
             days = list(schedule_manager.schedule.keys())
+            week = displayed["week"]
+            if week is None:
+                headers = [day.capitalize() for day in days]
+                week_label = "Semaine type"
+            else:
+                monday = date.fromisoformat(week)
+                headers = [f"{day.capitalize()} {(monday + timedelta(days=i)).strftime('%d/%m')}"
+                           for i, day in enumerate(days)]
+                week_label = f"Semaine du {monday.strftime('%d/%m/%Y')}"
 
             # Grille principale pour l'emploi du temps
-            grid = ft.Column(spacing=2, expand=True)
+            grid = ft.Column(spacing=0, expand=True)
 
             # Ligne des en-têtes (jours)
             header_row = ft.Row(
@@ -618,93 +1460,146 @@ def main(page: ft.Page):
                 ]
                 + [
                     ft.Container(
-                        content=ft.Text(day.capitalize(), weight="bold", size=14, text_align="center"),
+                        content=ft.Text(header, weight="bold", size=14, text_align="center"),
                         bgcolor=ft.colors.BLUE_GREY_100,
                         padding=10,
                         expand=True,
                         border=ft.border.all(1, ft.colors.BLACK12),
                     )
-                    for day in days
+                    for header in headers
                 ],
                 alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
             )
 
-            # Lignes horaires et colonnes des contenus
-            for time_slot in time_slots:
-                row = ft.Row(
-                    [
-                        # Colonne des heures
-                        ft.Container(
-                            content=ft.Text(time_slot, weight="bold", size=12, text_align="center"),
-                            bgcolor=ft.colors.LIGHT_GREEN_50,
-                            padding=10,
-                            expand=True,
-                            border=ft.border.all(1, ft.colors.BLACK12),
-                        )
-                    ]
+            # Hauteur d'une ligne : une heure occupe toujours la même hauteur, quelle que soit la granularité
+            row_height = HOUR_HEIGHT * schedule_manager.granularity / 60
+
+            # Colonne des heures : une étiquette par heure, fusionnée sur les lignes qu'elle couvre
+            rows_per_hour = 60 // schedule_manager.granularity
+            hours_column = ft.Column(
+                [
+                    ft.Container(
+                        content=ft.Text(time_slots[i].split('-')[0], weight="bold", size=12, text_align="center"),
+                        bgcolor=ft.colors.LIGHT_GREEN_50,
+                        height=HOUR_HEIGHT * min(rows_per_hour, len(time_slots) - i) / rows_per_hour,
+                        alignment=ft.alignment.top_center,
+                        border=ft.border.all(1, ft.colors.BLACK12),
+                    )
+                    for i in range(0, len(time_slots), rows_per_hour)
+                ],
+                spacing=0,
+                expand=True,
+            )
+
+            # Colonnes des jours : un bloc par cours (même sur plusieurs lignes) et un par plage vide
+            grid.controls.append(
+                ft.Row(
+                    [hours_column]
                     + [
-                        # Colonnes pour chaque jour
-                        ft.Container(
-                            content=get_cell_content(day, time_slot),
-                            bgcolor=ft.colors.WHITE,
-                            padding=10,
+                        ft.Column(
+                            [create_block(slots, rows * row_height) for _, rows, slots in schedule_manager.layout_day(day, week)],
+                            spacing=0,
                             expand=True,
-                            border=ft.border.all(1, ft.colors.BLACK12),
                         )
                         for day in days
                     ],
+                    vertical_alignment=ft.CrossAxisAlignment.START,
                     alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
                 )
-                grid.controls.append(row)
+            )
 
             # Mise à jour de la vue avec l'emploi du temps
             schedule_view.content = ft.Column(
                 [
-                    ft.Text("Emploi du temps", size=24, weight="bold", text_align="center"),
+                    ft.Row(
+                        [
+                            ft.Text("Emploi du temps", size=24, weight="bold", text_align="center"),
+                            ft.Row(
+                                [
+                                    ft.IconButton(icon=ft.icons.CHEVRON_LEFT, tooltip="Semaine précédente",
+                                                  on_click=lambda e: shift_week(-1)),
+                                    ft.Text(week_label, weight="bold"),
+                                    ft.IconButton(icon=ft.icons.CHEVRON_RIGHT, tooltip="Semaine suivante",
+                                                  on_click=lambda e: shift_week(1)),
+                                    ft.TextButton("Semaine type", disabled=week is None,
+                                                  on_click=lambda e: show_week(None)),
+                                ],
+                            ),
+                            granularity_dropdown,
+                        ],
+                        alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+                    ),
                     header_row,
                     ft.Divider(height=1, thickness=1, color=ft.colors.BLACK12),
                     grid,
                 ],
                 expand=True,
             )
-            page.update()
+            update_controls(schedule_view)
 
-        def get_cell_content(day: str, time_slot_str: str) -> ft.Container:
-            """Génère le contenu d'une cellule de l'emploi du temps."""
-            start_str, end_str = time_slot_str.split('-')
-            slot_start_time = time_str_to_time(start_str)
-            slot_end_time = time_str_to_time(end_str.replace('h', ''))
-
-            if slot_start_time is None or slot_end_time is None:
-                return ft.Text("Erreur", color=ft.colors.RED)
-
-            day_upper = day.upper()
-            for slot in schedule_manager.schedule[day_upper]:
-                if slot.start_time <= slot_start_time < slot.end_time:
-                    return ft.Container(
-                        content=ft.Row(
-                            [
-                                ft.Text(slot.course, weight="bold", color=ft.colors.BLACK, size=12),
-                                ft.IconButton(
-                                    icon=ft.icons.DELETE,
-                                    icon_size=16,
-                                    tooltip="Supprimer cet événement",
-                                    on_click=lambda e, d=day, s=slot.start_time: delete_event(d, s),
-                                ),
-                            ],
-                            alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+        def create_course(slot: TimeSlot, height: Optional[float] = None) -> ft.Container:
+            hours = f"{slot.start_time.strftime('%Hh%M')}-{slot.end_time.strftime('%Hh%M')}"
+            return ft.Container(
+                content=ft.Row(
+                    [
+                        ft.Text(f"{slot.course} ({hours})", weight="bold", color=ft.colors.BLACK, size=12, expand=True),
+                        ft.IconButton(
+                            icon=ft.icons.DELETE,
+                            icon_size=14,
+                            padding=0,
+                            tooltip="Supprimer cet événement",
+                            on_click=lambda e, slot_id=slot.id: delete_event(slot_id),
                         ),
-                        bgcolor=slot.color,  # Utilisation de la couleur associée
-                        padding=10,
-                        border_radius=5,
-                    )
+                    ],
+                    alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+                    vertical_alignment=ft.CrossAxisAlignment.START,
+                ),
+                bgcolor=slot.color,  # Utilisation de la couleur associée
+                height=height,
+                expand=height is None,
+                padding=ft.padding.symmetric(horizontal=6, vertical=2),
+                border_radius=5,
+                border=ft.border.all(1, ft.colors.BLACK12),
+                clip_behavior=ft.ClipBehavior.HARD_EDGE,
+            )
 
-            return ft.Text("")  # Cellule vide si aucun contenu n'est trouvé
+        def create_block(slots: List[TimeSlot], height: float) -> ft.Container:
+            """Génère un bloc de la grille : un cours sur toute sa durée, des cours qui partagent une ligne, ou une plage vide."""
+            if not slots:
+                return ft.Container(height=height, bgcolor=ft.colors.WHITE, border=ft.border.all(1, ft.colors.BLACK12))
+            if len(slots) == 1:
+                return create_course(slots[0], height)
+            # Cours empilés dans les lignes qu'ils se partagent
+            return ft.Container(content=ft.Column([create_course(slot) for slot in slots], spacing=0), height=height)
+
+        def change_granularity(e):
+            schedule_manager.set_granularity(int(granularity_dropdown.value))
+            store.publish(profile, ["schedule"], origin=subscription)
+            refresh_schedule()
+
+        granularity_dropdown = ft.Dropdown(
+            label="Granularité",
+            value=str(schedule_manager.granularity),
+            options=[ft.dropdown.Option(str(minutes), f"{minutes} min") for minutes in GRANULARITIES],
+            on_change=change_granularity,
+            width=140,
+        )
 
-        def delete_event(day: str, start_time: time):
-            """Supprime un événement spécifique d'une cellule."""
-            schedule_manager.remove_time_slot(day.upper(), start_time)
+        def delete_event(slot_id: str):
+            """Supprime un événement : de la semaine type, ou seulement de la semaine datée affichée."""
+            week = displayed["week"]
+            if slot_id in schedule_manager.week_slots_by_id:
+                _, day, slot = schedule_manager.week_slots_by_id[slot_id]
+            else:
+                day, slot = schedule_manager.slots_by_id[slot_id]
+            schedule_manager.remove_time_slot_by_id(slot_id, week)
+            store.publish(profile, ["schedule"], origin=subscription)
             refresh_schedule()
+            record_undo(Operation(
+                f"Créneau « {slot.course} » supprimé", "schedule",
+                undo=lambda: schedule_manager.restore_slot(day, slot, week),
+                redo=lambda: schedule_manager.remove_time_slot_by_id(slot.id, week)
+            ))
 
         def show_add_event_dialog():
             """Affiche un formulaire pour ajouter un événement."""
@@ -727,6 +1622,10 @@ def main(page: ft.Page):
                 width=200,
             )
             temp_checkbox = ft.Checkbox(label="Temporaire", value=False)
+            week = displayed["week"]
+            scope_text = ft.Text("Toutes les semaines (semaine type)" if week is None
+                                 else f"Semaine du {date.fromisoformat(week).strftime('%d/%m/%Y')} uniquement",
+                                 italic=True)
             error_text = ft.Text("", color=ft.colors.RED)
 
             def add_event(e):
@@ -744,10 +1643,10 @@ def main(page: ft.Page):
                     page.update()
                     return
 
-                start = time_str_to_time(start_field.value)
-                end = time_str_to_time(end_field.value)
-
-                if start is None or end is None:
+                try:
+                    start = parse_time(start_field.value)
+                    end = parse_time(end_field.value)
+                except ValueError:
                     error_text.value = "Format d'heure invalide (utilisez '6h' ou '6h30')."
                     page.update()
                     return
@@ -761,9 +1660,11 @@ def main(page: ft.Page):
                         course_field.value,
                         temp_checkbox.value,
                         color_dropdown.value,  # Transmet la couleur choisie
+                        week,
                 ):
                     error_text.value = ""
                     page.dialog.open = False
+                    store.publish(profile, ["schedule"], origin=subscription)
                     refresh_schedule()
                 else:
                     error_text.value = "Horaire invalide ou conflit détecté."
@@ -781,6 +1682,7 @@ def main(page: ft.Page):
                         course_field,
                         color_dropdown,
                         temp_checkbox,
+                        scope_text,
                         error_text,
                     ]
                 ),
@@ -792,6 +1694,97 @@ def main(page: ft.Page):
             page.dialog.open = True
             page.update()
 
+        def show_placement_dialog():
+            """Formulaire de placement automatique : un cours par ligne, placé sans conflit par le solveur."""
+            requests_field = ft.TextField(
+                label="Cours à placer (un par ligne)",
+                hint_text="Maths; 1h30; lundi mardi; 8h-12h; mardi 10h",
+                multiline=True,
+                min_lines=6,
+                width=500,
+            )
+            color_dropdown = ft.Dropdown(
+                label="Couleur des cours",
+                value="lightgreen",
+                options=[
+                    ft.dropdown.Option("lightblue", "Bleu"),
+                    ft.dropdown.Option("lightgreen", "Vert"),
+                    ft.dropdown.Option("lightcoral", "Rouge"),
+                    ft.dropdown.Option("lightyellow", "Jaune"),
+                ],
+                width=200,
+            )
+            error_text = ft.Text("", color=ft.colors.RED)
+            week = displayed["week"]
+
+            def place(e):
+                days = list(schedule_manager.schedule.keys())
+                requests = []
+                try:
+                    for line in (requests_field.value or "").splitlines():
+                        if line.strip():
+                            request = parse_request(line, days)
+                            request.color = color_dropdown.value
+                            requests.append(request)
+                except ValueError as error:
+                    error_text.value = str(error)
+                    page.update()
+                    return
+                if not requests:
+                    error_text.value = "Aucun cours à placer."
+                    page.update()
+                    return
+
+                added, placement = schedule_manager.place_courses(requests, week)
+                page.dialog.open = False
+                if not added:
+                    show_snack_bar("Aucun cours n'a pu être placé (plages horaires pleines ou trop courtes).")
+                    return
+                store.publish(profile, ["schedule"], origin=subscription)
+                refresh_schedule()
+                label = f"{len(added)} cours placé(s)"
+                if placement.unplaced:
+                    names = [request.course for request in placement.unplaced]
+                    label += " ; non placés : " + ", ".join(names[:5])
+                    if len(names) > 5:
+                        label += f" et {len(names) - 5} autre(s)"
+
+                def undo():
+                    for _, slot in added:
+                        schedule_manager.remove_time_slot_by_id(slot.id, week, save=False)
+                    schedule_manager.save_schedule()
+                    return True
+
+                def redo():
+                    restored = all([schedule_manager.restore_slot(day, slot, week, save=False) for day, slot in added])
+                    schedule_manager.save_schedule()
+                    return restored
+
+                record_undo(Operation(label, "schedule", undo=undo, redo=redo))
+
+            page.dialog = ft.AlertDialog(
+                title=ft.Text("Placer des cours automatiquement"),
+                content=ft.Column(
+                    [
+                        ft.Text("cours; durée; jours autorisés; plage horaire; préférences (jours, heure)", size=12,
+                                color=ft.colors.GREY_600),
+                        requests_field,
+                        color_dropdown,
+                        ft.Text("Toutes les semaines (semaine type)" if week is None
+                                else f"Semaine du {date.fromisoformat(week).strftime('%d/%m/%Y')} uniquement",
+                                italic=True),
+                        error_text,
+                    ],
+                    tight=True,
+                ),
+                actions=[
+                    ft.TextButton("Annuler", on_click=lambda e: close_dialog()),
+                    ft.ElevatedButton("Placer", on_click=place, bgcolor=ft.colors.BLUE, color=ft.colors.WHITE),
+                ],
+            )
+            page.dialog.open = True
+            page.update()
+
         def close_dialog():
             """Ferme le formulaire."""
             page.dialog.open = False
@@ -808,11 +1801,29 @@ def main(page: ft.Page):
             tooltip="Ajouter un événement",
         )
 
+        export_button = ft.IconButton(
+            icon=ft.icons.DOWNLOAD,
+            tooltip="Exporter l'emploi du temps (ICS)",
+            on_click=lambda e: export_in_background(
+                export_schedule(), f"emploi_du_temps_{profile}.ics"),
+        )
+
+        def export_schedule():
+            schedule, weeks = schedule_manager.snapshot()
+            return schedule_ics(schedule, weeks=weeks)
+
+        placement_button = ft.IconButton(
+            icon=ft.icons.AUTO_FIX_HIGH,
+            tooltip="Placer des cours automatiquement",
+            on_click=lambda e: show_placement_dialog(),
+        )
+
         # Rafraîchir l'emploi du temps pour afficher les données
         refresh_schedule()
 
         # Affichage final avec le bouton "+" fixe en bas
         show_with_menu(
+            "schedule",
             ft.Stack(
                 [
                     schedule_view,
@@ -821,14 +1832,75 @@ def main(page: ft.Page):
                         alignment=ft.alignment.bottom_right,
                         margin=ft.margin.all(20),
                     ),
+                    ft.Container(
+                        content=ft.Row([placement_button, export_button], tight=True),
+                        alignment=ft.alignment.top_right,
+                        margin=ft.margin.all(10),
+                    ),
                 ],
                 expand=True,
-            )
+            ),
+            ["schedule"],
+            refresh_schedule,
+            remove_expired,
         )
 
         # Créer et retourner l'onglet
 
 
+    # Fonctionnalité Agenda : tâches et événements à venir, toutes listes confondues
+    def agenda_tab():
+        agenda_view = ft.Column(spacing=5)
+        more_button = ft.TextButton("Voir plus", on_click=lambda e: load_more())
+        # Flux trié en cours de lecture ; chaque "Voir plus" en consomme la page suivante
+        stream = {"items": None}
+
+        def create_agenda_tile(item):
+            date_part, _, time_part = item.key.partition(" ")
+            is_task = item.kind == "task"
+            return ft.ListTile(
+                leading=ft.Icon(ft.icons.CHECKLIST if is_task else ft.icons.EVENT,
+                                color=ft.colors.BLUE_500 if is_task else ft.colors.INDIGO_400),
+                title=ft.Text(item.title, size=14),
+                subtitle=ft.Text(f"{date_part} {time_part} · {item.source}".strip(), size=12),
+                dense=True,
+                data=item.key
+            )
+
+        def load_more():
+            page_items = []
+            for item in stream["items"]:
+                page_items.append(item)
+                if len(page_items) == AGENDA_PAGE_SIZE:
+                    break
+            agenda_view.controls.extend(create_agenda_tile(item) for item in page_items)
+            more_button.visible = len(page_items) == AGENDA_PAGE_SIZE
+            if not agenda_view.controls:
+                agenda_view.controls.append(ft.Text("Rien de prévu.", color=ft.colors.BLACK54))
+            update_controls(agenda_view, more_button)
+
+        def refresh_agenda():
+            tasks_index = store.index(profile, "pending_tasks_by_time", ["task_lists"], build_pending_tasks_index)
+            events_index = store.index(profile, "events_by_date", ["events"], build_events_index)
+            stream["items"] = agenda_stream(tasks_index, events_index)
+            agenda_view.controls.clear()
+            load_more()
+
+        def agenda_outdated():
+            # Le premier élément affiché est passé : la liste ne commence plus à maintenant
+            first = next((control.data for control in agenda_view.controls if control.data), None)
+            now = datetime.now().strftime("%Y-%m-%d %H:%M")
+            # Un élément sans heure ne passe qu'à la fin de sa journée
+            return first is not None and first < (now if len(first) > 10 else now[:10])
+
+        refresh_agenda()
+
+        show_with_menu("agenda", ft.Column([
+            ft.Text("À venir", style="headlineSmall", size=18),
+            agenda_view,
+            more_button
+        ], expand=True, scroll=ft.ScrollMode.AUTO, spacing=10), ["task_lists", "events"], refresh_agenda, agenda_outdated)
+
     # Fonctionnalité Calendrier améliorée (type Google Agenda)
     def calendar_tab():
         now = datetime.now()
@@ -836,6 +1908,7 @@ def main(page: ft.Page):
         current_month = now.month
 
         selected_date_text = ft.Text("Sélectionnez une date sur le calendrier", size=16)
+        selected_date_state = {"value": None}
         event_list_view = ft.Column()
 
         def generate_calendar(year, month):
@@ -852,6 +1925,13 @@ def main(page: ft.Page):
 
             calendar = ft.Column(spacing=5, expand=True)
 
+            # Jours ayant des événements : recherche par intervalle dans l'index, plus les archives du mois
+            month_str = f"{year}-{month:02d}"
+            index = store.index(profile, "events_by_date", ["events"], build_events_index)
+            days_with_events = {event["date"] for event in index.range(f"{month_str}-01", f"{month_str}-31")}
+            if month_str in archive.months():
+                days_with_events.update(event["date"] for event in archive.month(month_str)["events"].values())
+
             header = ft.Row(
                 [ft.Container(
                     ft.Text(day_name, weight="bold", size=16),
@@ -868,11 +1948,10 @@ def main(page: ft.Page):
 
             for day in range(1, days_in_month + 1):
                 date_str = f"{year}-{month:02d}-{day:02d}"
-                events_today = [event for event in data["events"] if event["date"] == date_str]
                 day_container = ft.Container(
                     content=ft.Text(str(day), size=14),
                     alignment=ft.alignment.center,
-                    bgcolor=ft.colors.LIGHT_BLUE_100 if events_today else ft.colors.TRANSPARENT,
+                    bgcolor=ft.colors.LIGHT_BLUE_100 if date_str in days_with_events else ft.colors.TRANSPARENT,
                     on_click=lambda e, d=date_str: select_date(d),
                     expand=True,
                     border=ft.border.all(1, ft.colors.BLACK12),
@@ -891,6 +1970,7 @@ def main(page: ft.Page):
             return calendar
 
         def select_date(selected_date):
+            selected_date_state["value"] = selected_date
             selected_date_text.value = f"Date sélectionnée : {selected_date}"
             refresh_events(selected_date)
             show_event_dialog(selected_date)
@@ -898,28 +1978,42 @@ def main(page: ft.Page):
 
         def refresh_events(selected_date):
             event_list_view.controls.clear()
-            for event in data["events"]:
-                if event["date"] == selected_date:
-                    current_event = event
-
-                    def make_delete_handler(ev):
-                        return lambda e: delete_event(ev, selected_date)
-
-                    event_list_view.controls.append(
-                        ft.ListTile(
-                            title=ft.Text(event['title']),
-                            trailing=ft.IconButton(
-                                icon=ft.icons.DELETE,
-                                on_click=make_delete_handler(current_event)
-                            )
+            index = store.index(profile, "events_by_date", ["events"], build_events_index)
+            for event in index.range(selected_date, selected_date):
+                event_list_view.controls.append(
+                    ft.ListTile(
+                        title=ft.Text(event['title']),
+                        trailing=ft.IconButton(
+                            icon=ft.icons.DELETE,
+                            on_click=lambda e, event_id=event["id"]: delete_event(event_id, selected_date)
                         )
                     )
-            page.update()
+                )
+            if selected_date[:7] in archive.months():
+                # Les événements archivés sont affichés en lecture seule
+                for event in archive.events_on(selected_date):
+                    event_list_view.controls.append(
+                        ft.ListTile(title=ft.Text(event['title']), subtitle=ft.Text("Archivé", size=12))
+                    )
+            update_controls(event_list_view)
 
-        def delete_event(event, selected_date):
-            data["events"].remove(event)
+        def delete_event(event_id, selected_date):
+            def change():
+                event = data["events"].pop(event_id, None)
+                if event is not None:
+                    mark_deleted(data, event)
+                return event
+
+            event = save_data("events", change)
             refresh_events(selected_date)
             refresh_calendar()
+            if event is None:
+                return  # Déjà supprimé par une autre session
+            record_undo(dict_removal(
+                f"Événement « {event['title']} » supprimé", "events", data["events"], event_id, event,
+                on_restore=lambda: unmark_deleted(data, event),
+                on_remove=lambda: mark_deleted(data, event)
+            ))
 
         def show_event_dialog(selected_date):
             event_title_field = ft.TextField(label="Titre de l'événement", expand=True)
@@ -932,12 +2026,18 @@ def main(page: ft.Page):
                 description = event_description_field.value.strip()
                 if title and time:
                     event = {
+                        "id": new_id(),
                         "title": title,
                         "date": selected_date,
                         "time": time,
                         "description": description
                     }
-                    data["events"].append(event)
+
+                    def change():
+                        mark_created(data, event)
+                        data["events"][event["id"]] = event
+
+                    save_data("events", change)
                     refresh_events(selected_date)
                     refresh_calendar()
                     close_dialog()
@@ -965,7 +2065,6 @@ def main(page: ft.Page):
         def refresh_calendar():
             calendar_container.content = generate_calendar(current_year, current_month)
             update_month_label()
-            page.update()
 
         calendar_container = ft.Container(expand=True)
 
@@ -989,10 +2088,25 @@ def main(page: ft.Page):
 
         month_label = ft.Text("", style="headlineMedium", weight="bold", size=24)
 
+        def export_month():
+            # Seuls les événements du mois affiché sont parcourus, grâce à l'index par date
+            with store.lock:
+                index = store.index(profile, "events_by_date", ["events"], build_events_index)
+                events = [dict(event) for event in index.range(f"{current_year}-{current_month:02d}-01",
+                                                               f"{current_year}-{current_month:02d}-31")]
+            export_in_background(events_ics(events), f"evenements_{profile}_{current_year}-{current_month:02d}.ics")
+
+        def sync_calendars():
+            # La synchronisation tourne en arrière-plan ; la vue est rafraîchie par notification
+            sync_engine.request_sync()
+            page.snack_bar = ft.SnackBar(ft.Text("Synchronisation en cours..."))
+            page.snack_bar.open = True
+            page.update()
+
         def update_month_label():
             month_name = date(current_year, current_month, 1).strftime('%B %Y')
             month_label.value = month_name.capitalize()
-            page.update()
+            update_controls(calendar_container, month_label)
 
         month_navigation = ft.Row(
             [
@@ -1009,6 +2123,19 @@ def main(page: ft.Page):
                     bgcolor=ft.colors.BLUE_200,
                     border_radius=ft.border_radius.all(12),
                     padding=8
+                ),
+                ft.IconButton(
+                    icon=ft.icons.DOWNLOAD,
+                    tooltip="Exporter les événements du mois (ICS)",
+                    on_click=lambda e: export_month(),
+                    icon_size=20
+                ),
+                ft.IconButton(
+                    icon=ft.icons.SYNC,
+                    tooltip="Synchroniser les calendriers externes",
+                    on_click=lambda e: sync_calendars(),
+                    icon_size=20,
+                    visible=bool(data.get("calendars"))
                 )
             ],
             alignment=ft.MainAxisAlignment.CENTER,
@@ -1016,9 +2143,14 @@ def main(page: ft.Page):
             spacing=10
         )
 
+        def refresh_from_store():
+            if selected_date_state["value"]:
+                refresh_events(selected_date_state["value"])
+            refresh_calendar()
+
         refresh_calendar()
 
-        show_with_menu(ft.Column(
+        show_with_menu("calendar", ft.Column(
             [
                 month_navigation,
                 calendar_container,
@@ -1029,7 +2161,17 @@ def main(page: ft.Page):
             ],
             expand=True,
             spacing=20
-        ))
-
-    show_with_menu(ft.Text("Sélectionnez une fonctionnalité dans le menu déroulant.", color=TEXT_COLOR, text_align="center"))
-ft.app(main)
+        ), ["events"], refresh_from_store)
+
+    page.update()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scheduly")
+    parser.add_argument("--web", action="store_true",
+                        help="Mode serveur : une seule instance partagée par toutes les sessions du navigateur")
+    parser.add_argument("--port", type=int, default=8550)
+    args = parser.parse_args()
+    if args.web:
+        ft.app(main, view=ft.AppView.WEB_BROWSER, port=args.port)
+    else:
+        ft.app(main)
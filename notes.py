@@ -0,0 +1,202 @@
+"""Stockage du contenu des notes hors de data.json, par morceaux et par correctifs.
+
+Chaque note a son dossier 'notes/<profil>/<id>/' :
+- des morceaux de texte ('<empreinte>.txt') dont les frontières dépendent du
+  contenu (fin d'une ligne dont l'empreinte tombe sur un multiple donné) :
+  une modification ne change que les morceaux voisins, les autres gardent
+  leur nom et ne sont jamais réécrits ;
+- 'manifest.json', la liste ordonnée des morceaux et le nom du journal ;
+- le journal ('journal-<n>.jsonl'), les correctifs (remplacement d'un
+  intervalle) appliqués depuis le dernier manifeste.
+
+Une sauvegarde n'ajoute qu'un correctif au journal : son coût dépend de la
+taille de la modification, pas de celle de la note. Quand le journal devient
+trop gros, il est compacté en morceaux.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from coordination import FileLock, file_signature
+from store import profile_suffix
+
+# Taille visée des morceaux (en caractères) et bornes
+CHUNK_MIN = 16 * 1024
+CHUNK_MAX = 256 * 1024
+# Une fin de ligne sur CHUNK_BOUNDARY (en moyenne) termine un morceau une fois CHUNK_MIN atteint
+CHUNK_BOUNDARY = 64
+# Taille du journal (en octets) ou nombre de correctifs au-delà desquels il est compacté
+JOURNAL_LIMIT = 256 * 1024
+JOURNAL_PATCHES = 200
+
+# Délai sans frappe avant la sauvegarde automatique d'une note (en secondes)
+AUTOSAVE_DELAY = 1.0
+
+
+def split_chunks(text: str) -> List[str]:
+    """Découpe un texte en morceaux aux frontières définies par le contenu."""
+    chunks = []
+    start = 0
+    position = 0
+    length = len(text)
+    while position < length:
+        end = text.find("\n", position)
+        end = length if end < 0 else end + 1
+        size = end - start
+        line = text[position:end]
+        if size >= CHUNK_MAX or (size >= CHUNK_MIN and zlib.crc32(line.encode("utf-8")) % CHUNK_BOUNDARY == 0):
+            chunks.append(text[start:end])
+            start = end
+        position = end
+    if start < length:
+        chunks.append(text[start:])
+    return chunks
+
+
+def _common_prefix(a: str, b: str) -> int:
+    """Longueur du préfixe commun, par comparaisons de tranches (rapide sur de longs textes)."""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def diff(old: str, new: str) -> Optional[Tuple[int, int, str]]:
+    """Correctif minimal (début, fin, texte) qui transforme old en new : remplacer old[début:fin] par texte."""
+    if old == new:
+        return None
+    prefix = _common_prefix(old, new)
+    limit = min(len(old), len(new)) - prefix
+    suffix = _common_prefix(old[::-1][:limit], new[::-1][:limit])
+    return prefix, len(old) - suffix, new[prefix:len(new) - suffix]
+
+
+class NoteStore:
+    """Contenu des notes d'un profil, lu à la demande et sauvegardé par correctifs."""
+
+    def __init__(self, profile: str, root: str = "notes"):
+        self.directory = os.path.join(root, profile_suffix(profile))
+        # Dernier contenu sauvegardé de chaque note ouverte, version des fichiers lus et nombre de correctifs
+        self._saved: Dict[str, tuple] = {}
+        self._lock = threading.RLock()
+
+    def _dir(self, note_id: str) -> str:
+        return os.path.join(self.directory, note_id)
+
+    def _manifest(self, note_id: str) -> dict:
+        try:
+            with open(os.path.join(self._dir(note_id), "manifest.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"chunks": [], "journal": "journal.jsonl"}
+
+    def _version(self, note_id: str, manifest: dict) -> tuple:
+        directory = self._dir(note_id)
+        return (file_signature(os.path.join(directory, "manifest.json")),
+                file_signature(os.path.join(directory, manifest["journal"])))
+
+    def _read(self, note_id: str) -> Tuple[str, int]:
+        """Relit une note sur disque ; retourne (contenu, nombre de correctifs du journal)."""
+        directory = self._dir(note_id)
+        manifest = self._manifest(note_id)
+        parts = []
+        for name in manifest["chunks"]:
+            with open(os.path.join(directory, name), "r", encoding="utf-8", newline="") as f:
+                parts.append(f.read())
+        text = "".join(parts)
+        patches = 0
+        try:
+            with open(os.path.join(directory, manifest["journal"]), "r", encoding="utf-8") as f:
+                for line in f:
+                    start, end, inserted = json.loads(line)
+                    text = text[:start] + inserted + text[end:]
+                    patches += 1
+        except FileNotFoundError:
+            pass
+        self._saved[note_id] = (text, self._version(note_id, manifest), patches)
+        return text, patches
+
+    def content(self, note: dict) -> str:
+        """Contenu d'une note : stocké dans son dossier, ou encore dans data.json pour une ancienne note."""
+        if "content" in note:
+            return note["content"]
+        with self._lock:
+            return self._read(note["id"])[0]
+
+    def save(self, note: dict, text: str) -> bool:
+        """Sauvegarde le contenu d'une note ; retourne True si l'entrée de data.json a changé (à sauvegarder).
+
+        Une ancienne note dont le contenu était dans data.json y est retirée
+        lors de sa première sauvegarde ; ensuite data.json n'est plus touché.
+        """
+        note_id = note["id"]
+        directory = self._dir(note_id)
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            with FileLock(os.path.join(directory, "manifest.json")):
+                if "content" in note:
+                    self._compact(note_id, text)
+                    del note["content"]
+                    return True
+                manifest = self._manifest(note_id)
+                saved, version, patches = self._saved.get(note_id, (None, None, 0))
+                if saved is None or self._version(note_id, manifest) != version:
+                    # Note modifiée par une autre instance depuis la dernière lecture
+                    saved, patches = self._read(note_id)
+                patch = diff(saved, text)
+                if patch is None:
+                    return False
+                journal = os.path.join(directory, manifest["journal"])
+                with open(journal, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(patch, ensure_ascii=False) + "\n")
+                patches += 1
+                # La relecture rejoue chaque correctif : le journal reste court
+                if patches >= JOURNAL_PATCHES or os.path.getsize(journal) > max(JOURNAL_LIMIT, len(text)):
+                    self._compact(note_id, text)
+                else:
+                    self._saved[note_id] = (text, self._version(note_id, manifest), patches)
+        return False
+
+    def _compact(self, note_id: str, text: str):
+        """Réécrit la note en morceaux (seuls les morceaux nouveaux sont écrits) et repart d'un journal vide."""
+        directory = self._dir(note_id)
+        previous = self._manifest(note_id)
+        names = []
+        for chunk in split_chunks(text):
+            name = f"{hashlib.sha1(chunk.encode('utf-8')).hexdigest()[:20]}.txt"
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                with open(f"{path}.tmp", "w", encoding="utf-8", newline="") as f:
+                    f.write(chunk)
+                os.replace(f"{path}.tmp", path)
+            names.append(name)
+        # Nouveau journal à chaque compactage : l'ancien ne s'applique qu'à l'ancien manifeste
+        manifest = {"chunks": names, "journal": f"journal-{uuid.uuid4().hex[:8]}.jsonl"}
+        manifest_file = os.path.join(directory, "manifest.json")
+        with open(f"{manifest_file}.tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(f"{manifest_file}.tmp", manifest_file)
+        kept = set(names)
+        for name in os.listdir(directory):
+            if (name.endswith(".txt") and name not in kept) or name == previous["journal"]:
+                os.remove(os.path.join(directory, name))
+        self._saved[note_id] = (text, self._version(note_id, manifest), 0)
+
+    def prune(self, note_ids: Iterable[str]):
+        """Supprime les dossiers des notes qui n'existent plus."""
+        if not os.path.isdir(self.directory):
+            return
+        keep = set(note_ids)
+        with self._lock:
+            for name in os.listdir(self.directory):
+                if name not in keep:
+                    shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
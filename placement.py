@@ -0,0 +1,389 @@
+"""Placement automatique de cours dans l'emploi du temps.
+
+Chaque demande donne une durée, les jours et la plage horaire autorisés, et
+éventuellement des jours ou une heure de début préférés. Le solveur travaille
+sur un index d'occupation : un entier par jour, un bit par pas de la grille
+(la granularité de l'emploi du temps). Tester ou réserver un créneau est un
+simple ET / OU binaire.
+
+La recherche est un parcours en profondeur avec retour arrière :
+- propagation : chaque cours garde le nombre de ses positions encore libres,
+  mis à jour à chaque placement (seules les positions qui chevauchent le
+  créneau posé sont recomptées) et restauré au retour arrière ;
+- choix du cours le plus contraint (le moins de positions libres) ;
+- positions essayées de la moins pénalisée à la plus pénalisée, puis
+  abandon du cours (non plaçable) en dernier recours ;
+- séparation et évaluation : une branche qui ne peut pas faire mieux que la
+  meilleure solution (moins de cours non placés, puis moins de pénalité) est
+  coupée.
+
+La première descente donne déjà un placement complet ; le reste du budget de
+temps sert à l'améliorer. La recherche s'arrête dès qu'une solution atteint
+la borne inférieure, ou à la fin du budget avec la meilleure solution trouvée.
+"""
+import re
+import time as tm
+from dataclasses import dataclass, field
+from datetime import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Budget de temps par défaut d'un placement (en secondes)
+PLACEMENT_BUDGET = 0.3
+# Pénalité d'un cours placé hors de ses jours préférés (équivaut à un décalage de 2 h)
+DAY_PENALTY = 120
+# Plage horaire d'une demande qui n'en précise pas
+DEFAULT_EARLIEST = time(8, 0)
+DEFAULT_LATEST = time(18, 0)
+# Fréquence (en nœuds) de la vérification du budget
+_CLOCK_INTERVAL = 64
+
+
+@dataclass
+class CourseRequest:
+    course: str
+    duration: int  # en minutes
+    days: Sequence[str] = ()  # jours autorisés (tous si vide)
+    earliest: time = DEFAULT_EARLIEST  # début au plus tôt
+    latest: time = DEFAULT_LATEST  # fin au plus tard
+    preferred_days: Sequence[str] = ()
+    preferred_start: Optional[time] = None
+    color: str = "lightblue"
+
+
+@dataclass
+class Placement:
+    # (demande, jour, début, fin) des cours placés
+    placed: List[Tuple[CourseRequest, str, time, time]] = field(default_factory=list)
+    unplaced: List[CourseRequest] = field(default_factory=list)
+    penalty: int = 0
+    # True si la recherche a prouvé qu'on ne pouvait pas faire mieux avant la fin du budget
+    optimal: bool = False
+
+
+def _minutes(moment: time) -> int:
+    return moment.hour * 60 + moment.minute
+
+
+def parse_time(text: str) -> time:
+    """'8', '8h', '8h30', '08:30' -> time ; ValueError sinon.
+
+    Utilisée par toutes les saisies d'heures de l'emploi du temps.
+    """
+    match = re.fullmatch(r"(\d{1,2})(?:\s*[h:]\s*(\d{2})?)?", text.strip().lower())
+    if not match or int(match.group(1)) > 23 or int(match.group(2) or 0) > 59:
+        raise ValueError(f"Heure invalide : « {text.strip()} »")
+    return time(int(match.group(1)), int(match.group(2) or 0))
+
+
+def parse_request(line: str, days: Sequence[str]) -> CourseRequest:
+    """Lit une demande 'cours; durée; jours autorisés; plage; préférences'.
+
+    Seuls le cours et la durée sont obligatoires, ex. 'Maths; 1h30; lundi
+    mardi; 8h-12h; mardi 10h' : 1 h 30 le lundi ou le mardi entre 8 h et
+    12 h, de préférence le mardi à 10 h.
+    """
+    fields = [part.strip() for part in line.split(";")] + [""] * 4
+    course, duration, allowed, hours, preferences = fields[:5]
+    if not course or not duration:
+        raise ValueError(f"Cours et durée obligatoires : « {line.strip()} »")
+    duration_minutes = int(duration) if duration.isdigit() else _minutes(parse_time(duration))
+    if duration_minutes <= 0:
+        raise ValueError(f"Durée invalide : « {duration} »")
+    known = {day.lower(): day for day in days}
+
+    def day_names(words: Iterable[str]) -> List[str]:
+        names = []
+        for word in words:
+            if word.lower() not in known:
+                raise ValueError(f"Jour inconnu : « {word} »")
+            names.append(known[word.lower()])
+        return names
+
+    request = CourseRequest(course, duration_minutes, day_names(allowed.split()))
+    if hours:
+        earliest, _, latest = hours.partition("-")
+        request.earliest, request.latest = parse_time(earliest), parse_time(latest)
+    preferred = preferences.split()
+    request.preferred_days = day_names(word for word in preferred if not word[0].isdigit())
+    starts = [word for word in preferred if word[0].isdigit()]
+    if starts:
+        request.preferred_start = parse_time(starts[0])
+    return request
+
+
+class _Course:
+    __slots__ = ("request", "size", "full", "values", "windows", "best_cost", "free")
+
+    def __init__(self, request: CourseRequest, size: int):
+        self.request = request
+        self.size = size
+        self.full = (1 << size) - 1
+        # (pénalité, jour, première ligne, masque) triés par pénalité
+        self.values: List[tuple] = []
+        # jour -> (première, dernière ligne de début autorisée)
+        self.windows: Dict[int, Tuple[int, int]] = {}
+        self.best_cost = 0
+        # Nombre de positions encore libres
+        self.free = 0
+
+
+class _Solver:
+    def __init__(self, courses: List[_Course], occupancy: List[int], deadline: float):
+        self.courses = courses
+        self.occupancy = occupancy
+        self.deadline = deadline
+        self.on_day: List[List[int]] = [[] for _ in occupancy]
+        for index, course in enumerate(courses):
+            for day in course.windows:
+                self.on_day[day].append(index)
+        self.done = [False] * len(courses)
+        self.left = len(courses)
+        # Cours restants sans aucune position libre : ils seront forcément abandonnés
+        self.blocked = sum(1 for course in courses if course.free == 0)
+        self.skipped = 0
+        self.penalty = 0
+        # Somme des meilleures pénalités possibles des cours restants (borne inférieure)
+        self.rest = sum(course.best_cost for course in courses)
+        self.trail: List[int] = []
+        self.best: Optional[tuple] = None
+        self.best_choice: Dict[int, tuple] = {}
+        self.lower_bound = (self.blocked, self.rest)
+        self.optimal = False
+
+    # --- Propagation ---
+
+    def _place(self, index: int, day: int, start: int, mask: int, cost: int) -> tuple:
+        """Réserve le créneau et recompte les positions libres des cours qui le chevauchent."""
+        mark = len(self.trail)
+        occupied = self.occupancy[day]
+        end = start + self.courses[index].size
+        for other in self.on_day[day]:
+            if self.done[other] or other == index:
+                continue
+            course = self.courses[other]
+            low, high = course.windows[day]
+            full = course.full
+            for position in range(max(low, start - course.size + 1), min(high, end - 1) + 1):
+                if not (occupied >> position) & full:
+                    course.free -= 1
+                    self.trail.append(other)
+                    if course.free == 0:
+                        self.blocked += 1
+        self.occupancy[day] = occupied | mask
+        self._take(index, cost)
+        return mark, day, occupied, start, cost
+
+    def _unplace(self, index: int, applied: tuple):
+        mark, day, occupied, _, cost = applied
+        self._release(index, cost)
+        self.occupancy[day] = occupied
+        trail = self.trail
+        while len(trail) > mark:
+            course = self.courses[trail.pop()]
+            if course.free == 0:
+                self.blocked -= 1
+            course.free += 1
+
+    def _take(self, index: int, cost: int):
+        course = self.courses[index]
+        self.done[index] = True
+        self.left -= 1
+        self.penalty += cost
+        self.rest -= course.best_cost
+        if course.free == 0:
+            self.blocked -= 1
+
+    def _release(self, index: int, cost: int):
+        course = self.courses[index]
+        self.done[index] = False
+        self.left += 1
+        self.penalty -= cost
+        self.rest += course.best_cost
+        if course.free == 0:
+            self.blocked += 1
+
+    # --- Recherche ---
+
+    def _choose(self) -> int:
+        """Cours restant le plus contraint : le moins de positions libres, puis le plus long."""
+        best, best_key = -1, None
+        for index, course in enumerate(self.courses):
+            if not self.done[index]:
+                key = (course.free, -course.size)
+                if best_key is None or key < best_key:
+                    best, best_key = index, key
+                    if course.free == 0:
+                        break
+        return best
+
+    def _bound(self) -> tuple:
+        return self.skipped + self.blocked, self.penalty + self.rest
+
+    def _record(self, stack: List[list]):
+        score = (self.skipped, self.penalty)
+        if self.best is None or score < self.best:
+            self.best = score
+            self.best_choice = {frame[0]: frame[2] for frame in stack if frame[2] != "skip"}
+
+    def _next(self, frame: list) -> bool:
+        """Applique la valeur suivante du cours de frame ; False quand toutes ont été essayées."""
+        index, position = frame[0], frame[1]
+        course = self.courses[index]
+        values = course.values
+        while position < len(values):
+            cost, day, start, mask = values[position]
+            position += 1
+            if self.occupancy[day] & mask:
+                continue
+            if self.best is not None:
+                bound = (self.skipped + self.blocked, self.penalty + self.rest - course.best_cost + cost)
+                if bound >= self.best:
+                    # Positions triées par pénalité : les suivantes ne feront pas mieux
+                    position = len(values)
+                    break
+            applied = self._place(index, day, start, mask, cost)
+            if self.best is not None and self._bound() >= self.best:
+                self._unplace(index, applied)
+                continue
+            frame[1], frame[2] = position, applied
+            return True
+        frame[1] = position
+        if position == len(values):
+            # Dernier recours : le cours n'est pas placé
+            frame[1] = position + 1
+            self._take(index, 0)
+            self.skipped += 1
+            if self.best is None or self._bound() < self.best:
+                frame[2] = "skip"
+                return True
+            self.skipped -= 1
+            self._release(index, 0)
+        return False
+
+    def _undo(self, frame: list):
+        if frame[2] == "skip":
+            self.skipped -= 1
+            self._release(frame[0], 0)
+        else:
+            self._unplace(frame[0], frame[2])
+        frame[2] = None
+
+    def solve(self):
+        stack: List[list] = []
+        nodes = 0
+        descend = True
+        while True:
+            if descend:
+                if self.left == 0:
+                    self._record(stack)
+                    if self.best <= self.lower_bound:
+                        self.optimal = True
+                        return
+                else:
+                    stack.append([self._choose(), 0, None])
+            if not stack:
+                self.optimal = True
+                return
+            nodes += 1
+            if nodes % _CLOCK_INTERVAL == 0 and self.best is not None and tm.perf_counter() > self.deadline:
+                return
+            frame = stack[-1]
+            if frame[2] is not None:
+                self._undo(frame)
+            descend = self._next(frame)
+            if not descend:
+                stack.pop()
+
+
+def place_courses(requests: Sequence[CourseRequest], days: Sequence[str],
+                  occupied: Dict[str, Iterable[Tuple[time, time]]], step: int = 30,
+                  day_start: time = time(6, 0), time_budget: float = PLACEMENT_BUDGET) -> Placement:
+    """Place les cours demandés sans chevauchement entre eux ni avec les créneaux occupés.
+
+    La grille va de day_start à minuit par pas de step minutes ; un cours
+    occupe toujours un nombre entier de pas. Retourne le meilleur placement
+    trouvé dans le budget de temps et les cours qui n'ont pas pu être placés.
+    """
+    deadline = tm.perf_counter() + time_budget
+    origin = _minutes(day_start)
+    rows = (24 * 60 - origin) // step
+    day_index = {day: i for i, day in enumerate(days)}
+
+    occupancy = [0] * len(days)
+    for day, slots in occupied.items():
+        if day not in day_index:
+            continue
+        for start, end in slots:
+            end_minutes = 24 * 60 if end == time(23, 59) else _minutes(end)
+            first = max((_minutes(start) - origin) // step, 0)
+            last = min(-(-(end_minutes - origin) // step), rows)
+            if last > first:
+                occupancy[day_index[day]] |= ((1 << (last - first)) - 1) << first
+
+    # Demande sur chaque pas de la grille : nombre de cours qui souhaitent y commencer (ou s'y dérouler).
+    # À pénalité égale, un cours préfère les positions que les autres ne convoitent pas.
+    demand = [[0] * (rows + 1) for _ in days]
+    for request in requests:
+        if request.preferred_start is None:
+            continue
+        first = (_minutes(request.preferred_start) - origin) // step
+        last = min(first + -(-request.duration // step), rows)
+        for day in request.preferred_days or request.days or days:
+            if day in day_index and 0 <= first < last:
+                demand[day_index[day]][first] += 1
+                demand[day_index[day]][last] -= 1
+    # Sommes préfixes : contested[d][p] = demande cumulée des pas 0..p-1
+    contested = []
+    for row in demand:
+        running, level, sums = 0, 0, [0]
+        for delta in row[:rows]:
+            level += delta
+            running += level
+            sums.append(running)
+        contested.append(sums)
+
+    courses = []
+    for request in requests:
+        course = _Course(request, -(-request.duration // step))
+        low = max(-(-(_minutes(request.earliest) - origin) // step), 0)
+        latest = 24 * 60 if request.latest in (time(0, 0), time(23, 59)) else _minutes(request.latest)
+        high = min((latest - origin - request.duration) // step, rows - course.size)
+        allowed = [day for day in (request.days or days) if day in day_index]
+        for day in allowed:
+            d = day_index[day]
+            if low > high:
+                break
+            course.windows[d] = (low, high)
+            day_cost = DAY_PENALTY if request.preferred_days and day not in request.preferred_days else 0
+            for position in range(low, high + 1):
+                mask = course.full << position
+                # Propagation initiale : les positions déjà occupées ne seront jamais libres
+                if occupancy[d] & mask:
+                    continue
+                cost = day_cost
+                if request.preferred_start is not None:
+                    cost += abs(origin + position * step - _minutes(request.preferred_start))
+                course.values.append((cost, d, position, mask))
+        size = course.size
+        course.values.sort(key=lambda value: (value[0], contested[value[1]][value[2] + size] - contested[value[1]][value[2]],
+                                              value[2], value[1]))
+        course.free = len(course.values)
+        course.best_cost = course.values[0][0] if course.values else 0
+        courses.append(course)
+
+    solver = _Solver(courses, occupancy, deadline)
+    solver.solve()
+
+    placement = Placement(optimal=solver.optimal)
+    for index, course in enumerate(courses):
+        choice = solver.best_choice.get(index)
+        if choice is None:
+            placement.unplaced.append(course.request)
+            continue
+        _, d, _, start, cost = choice
+        start_minutes = origin + start * step
+        end_minutes = min(start_minutes + course.request.duration, 24 * 60 - 1)
+        placement.placed.append((course.request, days[d], time(*divmod(start_minutes, 60)),
+                                 time(*divmod(end_minutes, 60))))
+        placement.penalty += cost
+    return placement
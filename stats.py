@@ -0,0 +1,160 @@
+import heapq
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+# Compteurs affichés pour chaque liste de tâches et pour l'ensemble des listes
+COUNTERS = ("total", "completed", "overdue", "due_today")
+
+
+class _TaskRecord:
+    """État suivi pour une tâche (identifiée par son id)."""
+
+    __slots__ = ("list_id", "due", "completed", "overdue", "alive")
+
+    def __init__(self, list_id: str, due: Optional[datetime], completed: bool):
+        self.list_id = list_id
+        self.due = due
+        self.completed = completed
+        self.overdue = False
+        self.alive = True
+
+
+def _parse_due(task: dict) -> Optional[datetime]:
+    try:
+        return datetime.strptime(task["time"], "%Y-%m-%d %H:%M")
+    except (KeyError, ValueError):
+        return None
+
+
+class TaskStats:
+    """Compteurs de tâches (total, terminées, en retard, dues aujourd'hui) tenus à jour incrémentalement.
+
+    Chaque ajout, suppression ou changement d'état ne coûte que O(log n) ; la
+    lecture des compteurs d'une liste est en O(1). Le passage « en retard »
+    est piloté par un tas trié sur l'échéance : advance(now) ne traite que les
+    tâches dont l'échéance vient d'être dépassée.
+    """
+
+    def __init__(self):
+        self._records: Dict[str, _TaskRecord] = {}
+        self._lists: Dict[str, Counter] = {}
+        self._global = Counter()
+        # Tâches non terminées par jour d'échéance : jour -> liste -> nombre
+        self._pending_by_day: Dict[date, Counter] = {}
+        self._heap: List[tuple] = []
+        self._seq = 0
+        self._now = datetime.min
+
+    @classmethod
+    def build(cls, task_lists: Dict[str, dict], now: Optional[datetime] = None) -> "TaskStats":
+        stats = cls()
+        stats.rebuild(task_lists, now)
+        return stats
+
+    def rebuild(self, task_lists: Dict[str, dict], now: Optional[datetime] = None):
+        """Recalcule tous les compteurs (après une fusion des changements d'une autre instance)."""
+        self.__init__()
+        self._now = now or datetime.now()
+        for list_id, task_list in task_lists.items():
+            self.add_list(list_id)
+            for task in task_list["tasks"].values():
+                self.add_task(list_id, task)
+
+    # --- Lecture ---
+
+    def for_list(self, list_id: str, today: Optional[date] = None) -> Dict[str, int]:
+        counts = self._lists.get(list_id, Counter())
+        today = today or self._now.date()
+        return {
+            "total": counts["total"],
+            "completed": counts["completed"],
+            "overdue": counts["overdue"],
+            "due_today": self._pending_by_day.get(today, Counter())[list_id],
+        }
+
+    def totals(self, today: Optional[date] = None) -> Dict[str, int]:
+        today = today or self._now.date()
+        return {
+            "total": self._global["total"],
+            "completed": self._global["completed"],
+            "overdue": self._global["overdue"],
+            "due_today": sum(self._pending_by_day.get(today, Counter()).values()),
+        }
+
+    # --- Mises à jour ---
+
+    def _bump(self, list_id: str, counter: str, delta: int):
+        self._lists[list_id][counter] += delta
+        self._global[counter] += delta
+
+    def _track_pending(self, record: _TaskRecord, delta: int):
+        """Met à jour les compteurs qui ne concernent que les tâches non terminées."""
+        if record.due is None:
+            return
+        day = self._pending_by_day.setdefault(record.due.date(), Counter())
+        day[record.list_id] += delta
+        if delta > 0:
+            if record.due <= self._now:
+                record.overdue = True
+                self._bump(record.list_id, "overdue", 1)
+            else:
+                self._seq += 1
+                heapq.heappush(self._heap, (record.due, self._seq, record))
+        elif record.overdue:
+            record.overdue = False
+            self._bump(record.list_id, "overdue", -1)
+
+    def add_list(self, list_id: str):
+        self._lists.setdefault(list_id, Counter())
+
+    def remove_list(self, list_id: str, tasks: Iterable[dict]):
+        for task in tasks:
+            self.remove_task(task)
+        self._lists.pop(list_id, None)
+
+    def add_task(self, list_id: str, task: dict):
+        self.add_list(list_id)
+        record = _TaskRecord(list_id, _parse_due(task), task.get("completed", False))
+        self._records[task["id"]] = record
+        self._bump(list_id, "total", 1)
+        if record.completed:
+            self._bump(list_id, "completed", 1)
+        else:
+            self._track_pending(record, 1)
+
+    def remove_task(self, task: dict):
+        record = self._records.pop(task["id"], None)
+        if record is None:
+            return
+        record.alive = False
+        self._bump(record.list_id, "total", -1)
+        if record.completed:
+            self._bump(record.list_id, "completed", -1)
+        else:
+            self._track_pending(record, -1)
+
+    def update_completion(self, task: dict):
+        """À appeler après avoir changé task['completed']."""
+        record = self._records.get(task["id"])
+        completed = task.get("completed", False)
+        if record is None or record.completed == completed:
+            return
+        record.completed = completed
+        if completed:
+            self._bump(record.list_id, "completed", 1)
+            self._track_pending(record, -1)
+        else:
+            self._bump(record.list_id, "completed", -1)
+            self._track_pending(record, 1)
+
+    def advance(self, now: Optional[datetime] = None):
+        """Fait passer en retard les tâches dont l'échéance est dépassée (O(k log n))."""
+        self._now = now or datetime.now()
+        while self._heap and self._heap[0][0] <= self._now:
+            _, _, record = heapq.heappop(self._heap)
+            # Entrées périmées : tâche supprimée, terminée entre-temps ou déjà comptée
+            if not record.alive or record.completed or record.overdue:
+                continue
+            record.overdue = True
+            self._bump(record.list_id, "overdue", 1)
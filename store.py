@@ -0,0 +1,424 @@
+import copy
+import json
+import os
+import re
+import threading
+import time as tm
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from coordination import FileLock, FileWatcher, file_signature, merge_into
+
+# Profil utilisé en mode bureau ou quand aucun profil n'est précisé
+DEFAULT_PROFILE = "default"
+
+# Sujets auxquels une session peut s'abonner (un par onglet)
+TOPICS = ("task_lists", "notes", "schedule", "events")
+
+# Nombre maximal de rappels en attente d'affichage par session
+REMINDER_QUEUE_SIZE = 50
+
+
+def empty_data() -> dict:
+    """Retourne la structure de données vide d'un profil."""
+    return {"task_lists": {}, "notes": {}, "schedule": {}, "events": {}}
+
+
+def new_id() -> str:
+    """Identifiant stable d'une entité (liste, tâche, note, événement, créneau)."""
+    return uuid.uuid4().hex
+
+
+def _keyed_by_id(items) -> dict:
+    """Convertit une liste d'éléments en dictionnaire id -> élément, en attribuant les ids manquants."""
+    keyed = {}
+    for item in items:
+        item.setdefault("id", new_id())
+        keyed[item["id"]] = item
+    return keyed
+
+
+def migrate(data: dict) -> dict:
+    """Met à niveau les données de l'ancien format (clés = titres, listes sans identifiants).
+
+    Toutes les entités sont désormais rangées dans des dictionnaires id -> entité,
+    qui servent d'index : suppression, modification et bascule se font en O(1),
+    et renommer une liste ou une note ne change aucune clé.
+    """
+    for key, default in empty_data().items():
+        data.setdefault(key, default)
+
+    task_lists = {}
+    for key, task_list in data["task_lists"].items():
+        if "title" not in task_list:
+            # Ancien format : la clé était le titre de la liste
+            task_list = {"id": new_id(), "title": key, "tasks": task_list.get("tasks", [])}
+        if isinstance(task_list["tasks"], list):
+            task_list["tasks"] = _keyed_by_id(task_list["tasks"])
+        task_lists[task_list.setdefault("id", key)] = task_list
+    data["task_lists"] = task_lists
+
+    notes = {}
+    for key, note in data["notes"].items():
+        if isinstance(note, str):
+            note = {"id": new_id(), "title": key, "content": note}
+        notes[note.setdefault("id", key)] = note
+    data["notes"] = notes
+
+    if isinstance(data["events"], list):
+        data["events"] = _keyed_by_id(data["events"])
+    return data
+
+
+def profile_suffix(profile: str) -> str:
+    """Nettoie un nom de profil pour l'utiliser dans un nom de fichier."""
+    return re.sub(r"[^A-Za-z0-9_-]", "_", profile)
+
+
+def data_file(profile: str) -> str:
+    """Fichier de données d'un profil ('data.json' pour le profil par défaut)."""
+    if profile == DEFAULT_PROFILE:
+        return "data.json"
+    return f"data_{profile_suffix(profile)}.json"
+
+
+def schedule_file(profile: str) -> str:
+    """Fichier d'emploi du temps d'un profil ('schedule.json' par défaut)."""
+    if profile == DEFAULT_PROFILE:
+        return "schedule.json"
+    return f"schedule_{profile_suffix(profile)}.json"
+
+
+class ReminderQueue:
+    """File bornée des rappels d'une session, vidée par un thread propre à la session.
+
+    Le planificateur ne fait que déposer les rappels (sans jamais attendre
+    l'interface) ; le thread de la session les affiche par lots : tout ce qui
+    est arrivé depuis le dernier affichage est remis en un seul appel. Au-delà
+    de maxsize rappels en attente, les plus anciens sont comptés puis oubliés.
+    """
+
+    def __init__(self, deliver: Callable[[List[str], int], None], maxsize: int = REMINDER_QUEUE_SIZE):
+        self.deliver = deliver
+        self._pending: deque = deque(maxlen=maxsize)
+        self._dropped = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def put(self, messages: List[str]):
+        with self._condition:
+            if self._closed:
+                return
+            overflow = len(self._pending) + len(messages) - self._pending.maxlen
+            if overflow > 0:
+                self._dropped += overflow
+            self._pending.extend(messages)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                messages, dropped = list(self._pending), self._dropped
+                self._pending.clear()
+                self._dropped = 0
+            try:
+                self.deliver(messages, dropped)
+            except Exception:
+                continue  # Session déconnectée : les rappels suivants seront tentés quand même
+
+
+class Subscription:
+    """Abonnement d'une session aux changements d'un profil.
+
+    on_reminder(messages, dropped) reçoit les rappels par lots, avec le nombre
+    de rappels plus anciens qui n'ont pas pu être gardés en file.
+    """
+
+    def __init__(self, profile: str, on_change: Callable[[Set[str]], None],
+                 on_reminder: Optional[Callable[[List[str], int], None]] = None):
+        self.profile = profile
+        self.on_change = on_change
+        self.reminders = ReminderQueue(on_reminder) if on_reminder else None
+        # Sujets des vues de la session : vue affichée et onglets gardés en mémoire (masqués)
+        self.topics: Set[str] = set()
+
+
+class DataStore:
+    """Magasin en mémoire partagé par toutes les sessions d'un même processus.
+
+    Les données sont partitionnées par profil utilisateur : chaque profil est
+    chargé une seule fois, puis toutes les sessions de ce profil manipulent le
+    même dictionnaire. Les écritures disque sont sérialisées par un verrou et
+    les changements ne sont diffusés qu'aux sessions qui affichent les sujets
+    concernés.
+
+    Si une autre instance écrit le même fichier, ses changements sont
+    fusionnés entité par entité (voir coordination.merge_into) avant chaque
+    écriture, ou dès qu'ils sont détectés quand le profil est surveillé.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._partitions: Dict[str, dict] = {}
+        self._shared: Dict[tuple, object] = {}
+        # Index dérivés des données : (profil, nom) -> (sujets, index)
+        self._indexes: Dict[tuple, tuple] = {}
+        self._subscriptions: Dict[str, List[Subscription]] = {}
+        # Dernière version connue du fichier de chaque profil (base des fusions) et sa signature
+        self._disk: Dict[str, tuple] = {}
+        self._merge_listeners: Dict[str, List[Callable[[Set[str]], None]]] = {}
+
+    def get(self, profile: str = DEFAULT_PROFILE,
+            on_error: Optional[Callable[[Exception], None]] = None) -> dict:
+        """Retourne les données d'un profil, en les chargeant au premier accès."""
+        with self.lock:
+            if profile not in self._partitions:
+                self._partitions[profile] = self._load(profile, on_error)
+            return self._partitions[profile]
+
+    def _load(self, profile: str, on_error) -> dict:
+        try:
+            data, signature = self._read(profile)
+        except Exception as e:
+            if on_error:
+                on_error(e)
+            data, signature = None, None
+        data = data or empty_data()
+        self._disk[profile] = (copy.deepcopy(data), signature)
+        return data
+
+    def _read(self, profile: str) -> tuple:
+        """Lit le fichier d'un profil ; retourne (données, signature), ou (None, None) s'il n'existe pas."""
+        try:
+            with open(data_file(profile), "r", encoding="utf-8") as f:
+                stat = os.fstat(f.fileno())
+                return migrate(json.load(f)), (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return None, None
+
+    def _merge_external(self, profile: str) -> Set[str]:
+        """Fusionne la version sur disque si une autre instance l'a modifiée (verrous tenus par l'appelant)."""
+        base, signature = self._disk.get(profile, (empty_data(), None))
+        if file_signature(data_file(profile)) == signature:
+            return set()
+        remote, signature = self._read(profile)
+        if remote is None:
+            return set()
+        changed = merge_into(self._partitions[profile], base, remote)
+        self._disk[profile] = (remote, signature)
+        return changed
+
+    def _merged(self, profile: str, changed: Set[str]):
+        """Prévient les écouteurs et les sessions concernées après une fusion externe."""
+        if not changed:
+            return
+        for listener in list(self._merge_listeners.get(profile, [])):
+            listener(changed)
+        self.publish(profile, changed & set(TOPICS))
+
+    def on_merge(self, profile: str, listener: Callable[[Set[str]], None]):
+        """Enregistre un écouteur appelé avec les clés modifiées par une fusion externe."""
+        with self.lock:
+            self._merge_listeners.setdefault(profile, []).append(listener)
+
+    def reload_external(self, profile: str):
+        """Intègre les changements écrits par une autre instance, s'il y en a."""
+        with self.lock:
+            if profile not in self._partitions:
+                return
+            with FileLock(data_file(profile)):
+                changed = self._merge_external(profile)
+        self._merged(profile, changed)
+
+    def watch(self, profile: str):
+        """Surveille le fichier du profil pour fusionner les écritures des autres instances dès leur arrivée."""
+        self.shared(profile, "file_watcher",
+                    lambda: FileWatcher([data_file(profile)], lambda path: self.reload_external(profile))).start()
+
+    def shared(self, profile: str, name: str, factory: Callable[[], object]):
+        """Retourne un objet partagé par profil (ex. le gestionnaire d'emploi du temps)."""
+        with self.lock:
+            key = (profile, name)
+            if key not in self._shared:
+                self._shared[key] = factory()
+            return self._shared[key]
+
+    def index(self, profile: str, name: str, topics: Iterable[str], builder: Callable[[dict], object]):
+        """Retourne un index dérivé des données, reconstruit seulement après un changement des sujets."""
+        with self.lock:
+            key = (profile, name)
+            if key not in self._indexes:
+                self._indexes[key] = (set(topics), builder(self.get(profile)))
+            return self._indexes[key][1]
+
+    def invalidate(self, profile: str, topics: Iterable[str]):
+        """Oublie les index construits à partir des sujets modifiés."""
+        topics = set(topics)
+        with self.lock:
+            for key in [k for k, (index_topics, _) in self._indexes.items()
+                        if k[0] == profile and index_topics & topics]:
+                del self._indexes[key]
+
+    def profiles(self) -> List[str]:
+        with self.lock:
+            return list(self._partitions)
+
+    def save(self, profile: str = DEFAULT_PROFILE):
+        """Écrit les données d'un profil sur disque (écriture atomique).
+
+        Sous le verrou de fichier, les changements d'une autre instance sont
+        d'abord fusionnés : aucune des deux n'écrase les modifications de l'autre.
+        """
+        file = data_file(profile)
+        with self.lock:
+            with FileLock(file):
+                changed = self._merge_external(profile)
+                tmp_file = f"{file}.tmp"
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    json.dump(self._partitions[profile], f, ensure_ascii=False, indent=4)
+                os.replace(tmp_file, file)
+                self._disk[profile] = (copy.deepcopy(self._partitions[profile]), file_signature(file))
+        self._merged(profile, changed)
+
+    def subscribe(self, subscription: Subscription) -> Callable[[], None]:
+        """Enregistre une session ; retourne la fonction de désabonnement."""
+        with self.lock:
+            self._subscriptions.setdefault(subscription.profile, []).append(subscription)
+
+        def unsubscribe():
+            with self.lock:
+                subs = self._subscriptions.get(subscription.profile, [])
+                if subscription in subs:
+                    subs.remove(subscription)
+            if subscription.reminders:
+                subscription.reminders.close()
+
+        return unsubscribe
+
+    def subscriptions(self, profile: str) -> List[Subscription]:
+        with self.lock:
+            return list(self._subscriptions.get(profile, []))
+
+    def publish(self, profile: str, topics: Iterable[str], origin: Optional[Subscription] = None):
+        """Prévient les autres sessions du profil qui affichent l'un des sujets modifiés."""
+        topics = set(topics)
+        self.invalidate(profile, topics)
+        for sub in self.subscriptions(profile):
+            if sub is origin or not (sub.topics & topics):
+                continue
+            try:
+                sub.on_change(topics)
+            except Exception:
+                # Une session déconnectée ne doit pas empêcher la diffusion aux autres
+                continue
+
+    def deliver_reminders(self, profile: str, messages: List[str]):
+        """Dépose des rappels dans la file de chaque session ouverte du profil (sans attendre l'affichage)."""
+        for sub in self.subscriptions(profile):
+            if sub.reminders:
+                sub.reminders.put(messages)
+
+    def deliver_reminder(self, profile: str, message: str):
+        self.deliver_reminders(profile, [message])
+
+
+def due_reminders(data: dict, now: datetime) -> List[tuple]:
+    """Retourne les (élément, message) des tâches et événements à rappeler."""
+    reminders = []
+    for task_list in data["task_lists"].values():
+        for task in task_list["tasks"].values():
+            try:
+                task_time = datetime.strptime(task["time"], "%Y-%m-%d %H:%M")
+            except ValueError:
+                continue  # Format de date/heure incorrect : on l'ignore
+            if task_time <= now and not task.get("notified", False):
+                reminders.append((task, f"Rappel Tâche: {task['title']}"))
+    for event in data["events"].values():
+        try:
+            event_date = datetime.strptime(event["date"], "%Y-%m-%d")
+        except ValueError:
+            continue  # Gestion du mauvais format de date
+        if event_date.date() == now.date() and not event.get("notified", False):
+            reminders.append((event, f"Rappel Événement: {event['title']}"))
+    return reminders
+
+
+class ReminderScheduler:
+    """Thread unique qui vérifie les rappels de tous les profils chargés."""
+
+    def __init__(self, store: DataStore, interval: float = 60):
+        self.store = store
+        self.interval = interval
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Démarre le thread s'il ne tourne pas déjà (appelé par chaque session)."""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self.check(datetime.now())
+            tm.sleep(self.interval)
+
+    def check(self, now: datetime):
+        for profile in self.store.profiles():
+            try:
+                self.check_profile(profile, now)
+            except Exception as e:
+                self.store.deliver_reminder(
+                    profile, f"Erreur lors de la vérification des notifications : {e}")
+
+    def check_profile(self, profile: str, now: datetime):
+        """Marque tous les rappels échus du profil en une seule écriture, puis les envoie en un lot."""
+        with self.store.lock:
+            data = self.store.get(profile)
+            reminders = due_reminders(data, now)
+            if not reminders:
+                return
+            for item, _ in reminders:
+                item["notified"] = True
+            self.store.save(profile)
+        self.store.deliver_reminders(profile, [message for _, message in reminders])
+
+
+_store: Optional[DataStore] = None
+_scheduler: Optional[ReminderScheduler] = None
+_singleton_lock = threading.Lock()
+
+
+def get_store() -> DataStore:
+    """Magasin unique du processus, partagé par toutes les sessions."""
+    global _store
+    with _singleton_lock:
+        if _store is None:
+            _store = DataStore()
+        return _store
+
+
+def get_scheduler() -> ReminderScheduler:
+    """Planificateur de rappels unique du processus."""
+    global _scheduler
+    store = get_store()
+    with _singleton_lock:
+        if _scheduler is None:
+            _scheduler = ReminderScheduler(store)
+        return _scheduler
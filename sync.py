@@ -0,0 +1,540 @@
+"""Synchronisation incrémentale des événements du calendrier avec des calendriers externes.
+
+Deux types de calendriers distants sont gérés, déclarés dans data["calendars"] :
+
+    "calendars": {
+        "travail": {"kind": "caldav", "url": "https://serveur/dav/cal/travail/",
+                    "username": "...", "password": "..."},
+        "feries": {"kind": "ics", "url": "https://exemple.org/feries.ics"}
+    },
+    "default_calendar": "travail"
+
+- CalDAV : le jeton de synchronisation (RFC 6578) ne renvoie que les ressources
+  modifiées depuis la dernière synchronisation ; seules celles-ci sont
+  téléchargées (calendar-multiget). Si le serveur ne gère pas les jetons, on
+  compare les ETags obtenus par PROPFIND.
+- ICS (abonnement en lecture seule) : requête conditionnelle avec If-None-Match ;
+  le fichier n'est relu que s'il a changé, et seuls les événements modifiés
+  sont appliqués.
+
+Les événements créés ou supprimés localement sont envoyés par lots au serveur
+CalDAV du calendrier par défaut. Tout le travail réseau se fait hors du thread
+de l'interface, avec un nombre borné de requêtes simultanées.
+"""
+import hashlib
+import threading
+import urllib.error
+import urllib.request
+import uuid
+import base64
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from store import new_id
+
+DAV = "{DAV:}"
+CALDAV = "{urn:ietf:params:xml:ns:caldav}"
+
+# Nombre maximal de ressources demandées par requête calendar-multiget
+MULTIGET_BATCH = 100
+
+# Transport HTTP : (méthode, url, en-têtes, corps) -> (statut, en-têtes, corps)
+Transport = Callable[[str, str, Dict[str, str], Optional[bytes]], Tuple[int, Dict[str, str], bytes]]
+
+
+def urllib_transport(method: str, url: str, headers: Dict[str, str],
+                     body: Optional[bytes] = None) -> Tuple[int, Dict[str, str], bytes]:
+    """Transport HTTP par défaut basé sur urllib."""
+    request = urllib.request.Request(url, data=body, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers or {}), e.read() or b""
+
+
+class SyncError(Exception):
+    """Erreur renvoyée par un serveur de calendrier."""
+
+
+# --- Format ICS --------------------------------------------------------------
+
+def _unescape(value: str) -> str:
+    return (value.replace("\\n", "\n").replace("\\N", "\n")
+            .replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\"))
+
+
+def escape_text(value: str) -> str:
+    return (value.replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def fold_line(line: str) -> str:
+    """Replie une ligne ICS à 75 octets (RFC 5545 §3.1) sans couper de caractère UTF-8."""
+    if len(line.encode("utf-8")) <= 75:
+        return line
+    parts, current, size, limit = [], [], 0, 75
+    for char in line:
+        width = len(char.encode("utf-8"))
+        if size + width > limit:
+            parts.append("".join(current))
+            # Les lignes de continuation commencent par un espace, compté dans les 75 octets
+            current, size, limit = [], 0, 74
+        current.append(char)
+        size += width
+    parts.append("".join(current))
+    return "\r\n ".join(parts)
+
+
+def _unfold(text: str) -> List[str]:
+    """Recolle les lignes ICS repliées (lignes de continuation commençant par un espace)."""
+    lines: List[str] = []
+    for line in text.replace("\r\n", "\n").split("\n"):
+        if line[:1] in (" ", "\t") and lines:
+            lines[-1] += line[1:]
+        elif line:
+            lines.append(line)
+    return lines
+
+
+def _parse_dtstart(params: str, value: str) -> Tuple[str, str]:
+    """Convertit un DTSTART en (date 'YYYY-MM-DD', heure 'HH:MM')."""
+    if "VALUE=DATE" in params.upper() or len(value) == 8:
+        return datetime.strptime(value[:8], "%Y%m%d").strftime("%Y-%m-%d"), ""
+    if value.endswith("Z"):
+        moment = datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc).astimezone()
+    else:
+        moment = datetime.strptime(value[:15], "%Y%m%dT%H%M%S")
+    return moment.strftime("%Y-%m-%d"), moment.strftime("%H:%M")
+
+
+def parse_ics(text: str) -> List[dict]:
+    """Extrait les VEVENT d'un document ICS sous la forme des événements de data["events"]."""
+    events = []
+    current: Optional[dict] = None
+    for line in _unfold(text):
+        name, _, value = line.partition(":")
+        name, _, params = name.partition(";")
+        name = name.upper()
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            current = {"title": "", "date": "", "time": "", "description": ""}
+        elif name == "END" and value.upper() == "VEVENT":
+            if current is not None and current.get("uid") and current["date"]:
+                events.append(current)
+            current = None
+        elif current is None:
+            continue
+        elif name == "UID":
+            current["uid"] = value
+        elif name == "SUMMARY":
+            current["title"] = _unescape(value)
+        elif name == "DESCRIPTION":
+            current["description"] = _unescape(value)
+        elif name == "DTSTART":
+            try:
+                current["date"], current["time"] = _parse_dtstart(params, value)
+            except ValueError:
+                current["date"] = ""
+    return events
+
+
+def vevent_lines(event: dict) -> List[str]:
+    """Lignes ICS du VEVENT correspondant à un événement de data["events"]."""
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{event['uid']}",
+        f"DTSTAMP:{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}",
+    ]
+    try:
+        start = datetime.strptime(f"{event['date']} {event.get('time', '')}", "%Y-%m-%d %H:%M")
+        lines.append(f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}")
+    except ValueError:
+        day = datetime.strptime(event["date"], "%Y-%m-%d")
+        lines.append(f"DTSTART;VALUE=DATE:{day.strftime('%Y%m%d')}")
+    lines.append(f"SUMMARY:{escape_text(event.get('title', ''))}")
+    if event.get("description"):
+        lines.append(f"DESCRIPTION:{escape_text(event['description'])}")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def to_ics(event: dict) -> str:
+    """Sérialise un événement de data["events"] en document ICS."""
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Scheduly//FR"]
+    lines += vevent_lines(event)
+    lines += ["END:VCALENDAR", ""]
+    return "\r\n".join(fold_line(line) for line in lines)
+
+
+def _fingerprint(event: dict) -> str:
+    """Empreinte du contenu d'un événement, pour ignorer les entrées inchangées d'un flux ICS."""
+    raw = "\x1f".join(event.get(k, "") for k in ("title", "date", "time", "description"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+# --- Suivi des modifications locales -------------------------------------------
+
+def mark_created(data: dict, event: dict):
+    """À appeler quand un événement est créé localement : il sera envoyé au calendrier par défaut."""
+    event.setdefault("uid", event.get("id") or str(uuid.uuid4()))
+    calendar = data.get("default_calendar")
+    if calendar and data.get("calendars", {}).get(calendar, {}).get("kind") == "caldav":
+        event["calendar"] = calendar
+        event["dirty"] = True
+
+
+def mark_updated(event: dict):
+    """À appeler quand un événement synchronisé est modifié localement."""
+    if event.get("calendar"):
+        event["dirty"] = True
+
+
+def mark_deleted(data: dict, event: dict):
+    """À appeler quand un événement est supprimé localement : la suppression sera propagée."""
+    if event.get("href") and event.get("calendar"):
+        data.setdefault("sync_deleted", []).append(
+            {"calendar": event["calendar"], "href": event["href"], "etag": event.get("etag")})
+
+
+def unmark_deleted(data: dict, event: dict):
+    """À appeler quand la suppression d'un événement est annulée."""
+    if not event.get("href"):
+        return
+    pending = data.get("sync_deleted", [])
+    for tombstone in pending:
+        if tombstone["calendar"] == event.get("calendar") and tombstone["href"] == event["href"]:
+            pending.remove(tombstone)
+            return
+    # La suppression a déjà été envoyée : l'événement sera recréé sur le serveur
+    event.pop("href", None)
+    event.pop("etag", None)
+    event["dirty"] = True
+
+
+def mark_archived(data: dict, event: dict):
+    """À appeler quand un événement synchronisé quitte data["events"] pour les archives.
+
+    Son identité distante (href CalDAV, sinon UID du flux ICS) est gardée sur le
+    calendrier avec son ETag, pour que la réception ne le réimporte pas.
+    """
+    calendar = data.get("calendars", {}).get(event.get("calendar"))
+    key = event.get("href") or event.get("uid")
+    if calendar is not None and key:
+        calendar.setdefault("archived", {})[key] = event.get("etag")
+
+
+# --- Moteur de synchronisation ----------------------------------------------------
+
+class SyncEngine:
+    """Synchronise data["events"] d'un profil avec ses calendriers externes."""
+
+    def __init__(self, store, profile: str, transport: Transport = urllib_transport,
+                 interval: float = 300, max_workers: int = 4):
+        self.store = store
+        self.profile = profile
+        self.transport = transport
+        self.interval = interval
+        self.max_workers = max_workers
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.last_error: Optional[Exception] = None
+
+    def start(self):
+        """Démarre la synchronisation périodique en arrière-plan (sans effet si déjà démarrée)."""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def request_sync(self):
+        """Demande une synchronisation immédiate sans bloquer l'appelant."""
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def sync(self) -> bool:
+        """Effectue un cycle complet : envoi des changements locaux puis réception des deltas.
+
+        Retourne True si data["events"] a été modifié.
+        """
+        data = self.store.get(self.profile)
+        with self.store.lock:
+            calendars = dict(data.get("calendars", {}))
+        if not calendars:
+            return False
+
+        changed = self.push(data, calendars)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = list(pool.map(lambda item: self.pull(data, *item), calendars.items()))
+        changed = changed or any(results)
+
+        if changed:
+            self.store.save(self.profile)
+            self.store.publish(self.profile, ["events"])
+        return changed
+
+    # --- Requêtes HTTP ---
+
+    def _request(self, calendar: dict, method: str, url: str, body: Optional[bytes] = None,
+                 headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        headers = dict(headers or {})
+        if calendar.get("username"):
+            credentials = f"{calendar['username']}:{calendar.get('password', '')}".encode("utf-8")
+            headers["Authorization"] = "Basic " + base64.b64encode(credentials).decode("ascii")
+        if body is not None and "Content-Type" not in headers:
+            headers["Content-Type"] = "application/xml; charset=utf-8"
+        status, response_headers, content = self.transport(method, url, headers, body)
+        return status, {k.lower(): v for k, v in response_headers.items()}, content
+
+    # --- Réception ---
+
+    def pull(self, data: dict, name: str, calendar: dict) -> bool:
+        if calendar.get("kind") == "ics":
+            return self._pull_ics(data, name, calendar)
+        return self._pull_caldav(data, name, calendar)
+
+    def _pull_ics(self, data: dict, name: str, calendar: dict) -> bool:
+        headers = {}
+        if calendar.get("etag"):
+            headers["If-None-Match"] = calendar["etag"]
+        status, response_headers, content = self._request(calendar, "GET", calendar["url"], headers=headers)
+        if status == 304:
+            return False
+        if status != 200:
+            raise SyncError(f"{name} : GET {status}")
+
+        remote = {event["uid"]: event for event in parse_ics(content.decode("utf-8", "replace"))}
+        with self.store.lock:
+            local = {event["uid"]: event for event in data["events"].values()
+                     if event.get("calendar") == name and "uid" in event}
+            entry = data["calendars"][name]
+            # Les événements archivés ne sont pas réimportés ; on les oublie quand le flux ne les contient plus
+            if "archived" in entry:
+                entry["archived"] = {uid: etag for uid, etag in entry["archived"].items() if uid in remote}
+            archived = entry.get("archived", {})
+            changed = False
+            for uid, event in remote.items():
+                if uid in archived:
+                    continue
+                fingerprint = _fingerprint(event)
+                current = local.get(uid)
+                if current is not None and current.get("etag") == fingerprint:
+                    continue
+                changed = True
+                event.update({"calendar": name, "etag": fingerprint})
+                if current is None:
+                    event["id"] = new_id()
+                    data["events"][event["id"]] = event
+                else:
+                    event["id"] = current["id"]
+                    event["notified"] = current.get("notified", False)
+                    current.clear()
+                    current.update(event)
+            removed = [event for uid, event in local.items() if uid not in remote]
+            if removed:
+                changed = True
+                for event in removed:
+                    del data["events"][event["id"]]
+            entry["etag"] = response_headers.get("etag")
+        return changed
+
+    def _pull_caldav(self, data: dict, name: str, calendar: dict) -> bool:
+        url = calendar["url"]
+        try:
+            token, changed_hrefs, deleted_hrefs = self._sync_collection(calendar, url, calendar.get("sync_token"))
+        except SyncError:
+            if not calendar.get("sync_token"):
+                # Le serveur ne gère pas sync-collection : on compare les ETags
+                token = None
+                changed_hrefs, deleted_hrefs = self._etag_delta(calendar, url)
+            else:
+                # Jeton expiré : resynchronisation complète à partir d'un jeton vide
+                token, changed_hrefs, deleted_hrefs = self._sync_collection(calendar, url, None)
+                with self.store.lock:
+                    known = {event["href"] for event in data["events"].values()
+                             if event.get("calendar") == name and event.get("href")}
+                    known.update(calendar.get("archived", {}))
+                deleted_hrefs = known - set(changed_hrefs)
+
+        # Inutile de retélécharger ce que l'on connaît déjà (ex. nos propres envois) ou ce qui est archivé
+        with self.store.lock:
+            known_etags = {event["href"]: event.get("etag") for event in data["events"].values()
+                           if event.get("calendar") == name and event.get("href")}
+            archived = dict(data["calendars"][name].get("archived", {}))
+        to_fetch = [href for href, etag in changed_hrefs.items()
+                    if href not in archived and (etag is None or known_etags.get(href) != etag)]
+        fetched = self._multiget(calendar, url, to_fetch) if to_fetch else {}
+
+        with self.store.lock:
+            by_href = {event["href"]: event for event in data["events"].values()
+                       if event.get("calendar") == name and event.get("href")}
+            changed = False
+            for href, (etag, ics) in fetched.items():
+                current = by_href.get(href)
+                if current is not None and current.get("etag") == etag:
+                    continue
+                if current is not None and current.get("dirty"):
+                    continue  # La modification locale sera envoyée au prochain cycle
+                parsed = parse_ics(ics)
+                if not parsed:
+                    continue
+                event = parsed[0]
+                event.update({"calendar": name, "href": href, "etag": etag})
+                changed = True
+                if current is None:
+                    event["id"] = new_id()
+                    data["events"][event["id"]] = event
+                else:
+                    event["id"] = current["id"]
+                    event["notified"] = current.get("notified", False)
+                    current.clear()
+                    current.update(event)
+            deleted = {href for href in deleted_hrefs if href in by_href}
+            if deleted:
+                changed = True
+                for href in deleted:
+                    del data["events"][by_href[href]["id"]]
+            entry = data["calendars"][name]
+            entry["sync_token"] = token
+            if archived:
+                # Un événement archivé supprimé sur le serveur n'a plus besoin d'être retenu
+                entry["archived"] = {href: etag for href, etag in entry.get("archived", {}).items()
+                                     if href not in deleted_hrefs}
+            if token is None:
+                entry["etags"] = {href: event["etag"] for href, event in by_href.items()
+                                  if href not in deleted}
+                entry["etags"].update({href: etag for href, (etag, _) in fetched.items()})
+                entry["etags"].update(entry.get("archived", {}))
+        return changed
+
+    def _sync_collection(self, calendar: dict, url: str, token: Optional[str]):
+        body = (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            '<d:sync-collection xmlns:d="DAV:">'
+            f'<d:sync-token>{token or ""}</d:sync-token>'
+            '<d:sync-level>1</d:sync-level>'
+            '<d:prop><d:getetag/></d:prop>'
+            '</d:sync-collection>'
+        ).encode("utf-8")
+        status, _, content = self._request(calendar, "REPORT", url, body, {"Depth": "1"})
+        if status != 207:
+            raise SyncError(f"sync-collection {status}")
+        root = ET.fromstring(content)
+        changed, deleted = {}, set()
+        for response in root.iter(f"{DAV}response"):
+            href = response.findtext(f"{DAV}href")
+            if not href or not href.endswith(".ics"):
+                continue
+            if "404" in (response.findtext(f"{DAV}status") or ""):
+                deleted.add(href)
+            else:
+                changed[href] = response.findtext(f".//{DAV}getetag")
+        return root.findtext(f"{DAV}sync-token"), changed, deleted
+
+    def _etag_delta(self, calendar: dict, url: str):
+        body = ('<?xml version="1.0" encoding="utf-8"?>'
+                '<d:propfind xmlns:d="DAV:"><d:prop><d:getetag/></d:prop></d:propfind>').encode("utf-8")
+        status, _, content = self._request(calendar, "PROPFIND", url, body, {"Depth": "1"})
+        if status != 207:
+            raise SyncError(f"PROPFIND {status}")
+        remote = {}
+        for response in ET.fromstring(content).iter(f"{DAV}response"):
+            href = response.findtext(f"{DAV}href")
+            if href and href.endswith(".ics"):
+                remote[href] = response.findtext(f".//{DAV}getetag")
+        known = calendar.get("etags", {})
+        changed = {href: etag for href, etag in remote.items() if known.get(href) != etag}
+        return changed, set(known) - set(remote)
+
+    def _multiget(self, calendar: dict, url: str, hrefs: List[str]) -> Dict[str, Tuple[str, str]]:
+        batches = [hrefs[i:i + MULTIGET_BATCH] for i in range(0, len(hrefs), MULTIGET_BATCH)]
+
+        def fetch(batch):
+            body = (
+                '<?xml version="1.0" encoding="utf-8"?>'
+                '<c:calendar-multiget xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav">'
+                '<d:prop><d:getetag/><c:calendar-data/></d:prop>'
+                + "".join(f"<d:href>{href}</d:href>" for href in batch)
+                + '</c:calendar-multiget>'
+            ).encode("utf-8")
+            status, _, content = self._request(calendar, "REPORT", url, body, {"Depth": "1"})
+            if status != 207:
+                raise SyncError(f"calendar-multiget {status}")
+            result = {}
+            for response in ET.fromstring(content).iter(f"{DAV}response"):
+                ics = response.findtext(f".//{CALDAV}calendar-data")
+                if ics:
+                    result[response.findtext(f"{DAV}href")] = (response.findtext(f".//{DAV}getetag"), ics)
+            return result
+
+        fetched: Dict[str, Tuple[str, str]] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for result in pool.map(fetch, batches):
+                fetched.update(result)
+        return fetched
+
+    # --- Envoi ---
+
+    def push(self, data: dict, calendars: Dict[str, dict]) -> bool:
+        """Envoie en parallèle (nombre borné) les créations, modifications et suppressions locales."""
+        with self.store.lock:
+            dirty = [event for event in data["events"].values()
+                     if event.get("dirty") and calendars.get(event.get("calendar"), {}).get("kind") == "caldav"]
+            deletions = list(data.get("sync_deleted", []))
+            payloads = [(event, to_ics(event), _fingerprint(event)) for event in dirty]
+        if not dirty and not deletions:
+            return False
+
+        def put(item):
+            event, ics, fingerprint = item
+            calendar = calendars[event["calendar"]]
+            # Les serveurs CalDAV désignent les ressources par leur chemin
+            href = event.get("href") or urlsplit(urljoin(calendar["url"], f"{event['uid']}.ics")).path
+            headers = {"Content-Type": "text/calendar; charset=utf-8"}
+            if event.get("etag"):
+                headers["If-Match"] = event["etag"]
+            else:
+                headers["If-None-Match"] = "*"
+            status, response_headers, _ = self._request(calendar, "PUT", urljoin(calendar["url"], href),
+                                                        ics.encode("utf-8"), headers)
+            return event, fingerprint, href, status, response_headers.get("etag")
+
+        def delete(tombstone):
+            calendar = calendars.get(tombstone["calendar"])
+            if calendar is None:
+                return tombstone, 404
+            headers = {"If-Match": tombstone["etag"]} if tombstone.get("etag") else {}
+            status, _, _ = self._request(calendar, "DELETE", urljoin(calendar["url"], tombstone["href"]),
+                                         headers=headers)
+            return tombstone, status
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            put_results = list(pool.map(put, payloads))
+            delete_results = list(pool.map(delete, deletions))
+
+        with self.store.lock:
+            for event, fingerprint, href, status, etag in put_results:
+                if status in (200, 201, 204, 412):
+                    # 412 : modifié à distance entre-temps, la version du serveur sera reçue.
+                    # Un événement modifié pendant l'envoi reste à renvoyer.
+                    if status == 412 or _fingerprint(event) == fingerprint:
+                        event["dirty"] = False
+                    if status != 412:
+                        event["href"] = href
+                        event["etag"] = etag
+            done = [tombstone for tombstone, status in delete_results if status in (200, 204, 404, 412)]
+            data["sync_deleted"] = [t for t in data.get("sync_deleted", []) if t not in done]
+        return True